@@ -0,0 +1,60 @@
+import asyncio
+import weakref
+
+import aiohttp
+from django.conf import settings
+
+# One keep-alive session per event loop; a session cannot be shared between loops.
+# Values are (session, closer): see _close_on_shutdown.
+_sessions = weakref.WeakKeyDictionary()
+
+
+def _close_on_shutdown(session):
+    """Return an async generator that closes ``session`` when the running loop shuts down.
+
+    Advancing the generator to its ``yield`` registers it with the loop, and
+    ``loop.shutdown_asyncgens()`` (run by ``asyncio.run``, and so by
+    ``async_to_sync`` and ASGI servers) closes it, running the ``finally``.
+    Short-lived loops therefore don't leak their session and connector.
+    """
+    async def closer():
+        try:
+            yield
+        finally:
+            await session.close()
+
+    agen = closer()
+    try:
+        agen.asend(None).send(None)
+    except StopIteration:
+        pass
+    return agen
+
+
+def get_session():
+    """Return the pooled aiohttp session for the running event loop."""
+    loop = asyncio.get_running_loop()
+    session, _ = _sessions.get(loop, (None, None))
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.UPSTREAM_POOL_SIZE,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        session = aiohttp.ClientSession(connector=connector, raise_for_status=True)
+        _sessions[loop] = (session, _close_on_shutdown(session))
+    return session
+
+
+async def get_json(url, params=None, timeout=None):
+    """GET ``url`` and decode the JSON body, failing after ``timeout`` seconds."""
+    session = get_session()
+    async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        return await response.json(content_type=None)
+
+
+async def close_session():
+    """Close the session bound to the running event loop, if any."""
+    _, closer = _sessions.pop(asyncio.get_running_loop(), (None, None))
+    if closer is not None:
+        await closer.aclose()
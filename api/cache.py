@@ -0,0 +1,307 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Each entry may carry its own TTL so failed lookups can be cached for a
+    shorter period than successful ones (negative caching).
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        """Return the cached value for ``key`` or ``default`` if absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= self._timer():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        expires_at = self._timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key, default=MISSING):
+        """Return the value for ``key`` without touching counters or recency."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= self._timer():
+                return default
+            return entry[0]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SharedCache:
+    """:class:`TTLCache` interface over a Django cache backend.
+
+    Lets several processes share entries when ``backend`` is shared
+    (memcached, Redis, a database cache). Size and eviction are left to the
+    backend, so ``stats()`` only reports this process's hits and misses.
+    """
+
+    def __init__(self, backend, prefix, ttl=300):
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        # memcached keys cannot contain spaces or control characters
+        return f'{self.prefix}:{urllib.parse.quote(str(key))}'
+
+    def get(self, key, default=MISSING):
+        value = self.backend.get(self._key(key), MISSING)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(self._key(key), value, self.ttl if ttl is None else ttl)
+
+    def peek(self, key, default=MISSING):
+        return self.backend.get(self._key(key), default)
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def clear(self):
+        # Only this process's counters; the backend may hold other data
+        self.hits = self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': 0,
+            'maxsize': None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0,
+            'expirations': 0,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block until it finishes and share its result (or error).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of :class:`SingleFlight`.
+
+    Waiters are shielded from each other, so a cancelled request does not
+    cancel the fetch other requests are waiting on.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        flight_key = (asyncio.get_running_loop(), key)
+        future = self._calls.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[flight_key] = future
+            future.add_done_callback(lambda _: self._calls.pop(flight_key, None))
+        return await asyncio.shield(future)
+
+
+class StaleWhileRevalidateCache:
+    """Read-through cache that serves expired entries while refreshing them.
+
+    Entries are fresh for ``ttl`` seconds. For a further ``stale_ttl``
+    seconds the old value is returned immediately and a single background
+    refresh is started. Misses for the same key share one call to ``loader``.
+    Errors raised by ``loader`` propagate to callers on a miss and are
+    swallowed (keeping the stale value) on a background refresh.
+
+    Pass ``store`` (a :class:`SharedCache` whose ttl covers ``ttl +
+    stale_ttl``) to share entries between processes; ``timer`` must then be
+    wall-clock time, as freshness deadlines are compared across processes.
+    """
+
+    def __init__(self, loader, maxsize=1024, ttl=600, stale_ttl=900, timer=time.monotonic, store=None):
+        self.loader = loader
+        self.ttl = ttl
+        self._timer = timer
+        if store is None:
+            store = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl, timer=timer)
+        self._cache = store
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, key):
+        value = self.get_cached(key)
+        if value is MISSING:
+            return self.refresh(key)
+        return value
+
+    def get_cached(self, key):
+        """Return the cached value or MISSING, refreshing in the background if stale."""
+        entry = self._cache.get(key)
+        if entry is MISSING:
+            return MISSING
+        value, fresh_until = entry
+        if fresh_until <= self._timer():
+            self.refresh_async(key)
+        return value
+
+    def set(self, key, value):
+        """Store a freshly loaded ``value`` for ``key``."""
+        self._cache.set(key, (value, self._timer() + self.ttl))
+
+    def peek(self, key):
+        """Return ``(value, fresh_until)`` without counting a lookup, or MISSING."""
+        return self._cache.peek(key)
+
+    def expires_in(self, key):
+        """Return seconds until ``key`` goes stale (negative once stale), or None if absent."""
+        entry = self.peek(key)
+        if entry is MISSING:
+            return None
+        return entry[1] - self._timer()
+
+    def refresh(self, key):
+        """Load ``key`` synchronously, sharing any fetch already in flight."""
+        return self._flight.do(key, lambda: self._load(key))
+
+    def refresh_async(self, key):
+        """Start a background refresh of ``key`` unless one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        thread = threading.Thread(target=self._background_refresh, args=(key,), daemon=True)
+        thread.start()
+        return True
+
+    def _background_refresh(self, key):
+        try:
+            self.refresh(key)
+        except Exception:
+            self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _load(self, key):
+        value = self.loader(key)
+        self.set(key, value)
+        self.refreshes += 1
+        return value
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats['refreshes'] = self.refreshes
+        stats['refresh_errors'] = self.refresh_errors
+        return stats
@@ -0,0 +1,231 @@
+"""Offline IP -> city resolver backed by a memory-mapped range index.
+
+The index is compiled from a CSV of IP ranges into a compact binary file:
+
+    header   8s magic, uint32 record count, uint32 city count
+    records  record count x (16-byte start, 16-byte end, uint32 city id),
+             sorted by start, big-endian addresses
+    cities   city count x (uint16 length, UTF-8 name)
+
+IPv4 addresses are stored as IPv4-mapped IPv6 addresses so both families
+share one sorted keyspace. The records are only ever read through ``mmap``,
+so every worker process maps the same page-cache pages instead of loading
+its own copy. Running processes pick up a rebuilt index within
+``RELOAD_CHECK_INTERVAL`` seconds.
+"""
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HNGGEO1\x00'
+HEADER = struct.Struct('>8sII')
+RECORD = struct.Struct('>16s16sI')
+CITY_LENGTH = struct.Struct('>H')
+
+# Seconds between checks of the index file for a rebuild
+RELOAD_CHECK_INTERVAL = 30.0
+
+_IPV4_MAPPED = 0xFFFF << 32
+
+
+def ip_to_int(ip):
+    """Return the 128-bit key for an IPv4 or IPv6 address."""
+    address = ipaddress.ip_address(ip.strip())
+    if address.version == 4:
+        return _IPV4_MAPPED | int(address)
+    return int(address)
+
+
+def _parse_row(row):
+    """Return ``(start, end, city)`` for a ``network,city`` or ``start,end,city`` row."""
+    if len(row) == 2:
+        network = ipaddress.ip_network(row[0].strip(), strict=False)
+        start = ip_to_int(str(network.network_address))
+        end = ip_to_int(str(network.broadcast_address))
+        city = row[1]
+    elif len(row) == 3:
+        start, end, city = ip_to_int(row[0]), ip_to_int(row[1]), row[2]
+    else:
+        raise ValueError(f'expected 2 or 3 columns, got {len(row)}')
+    if start > end:
+        raise ValueError('range start is after range end')
+    return start, end, city.strip()
+
+
+def read_ranges(csv_file):
+    """Yield ``(start, end, city)`` tuples from a CSV file, skipping a header row."""
+    for line_no, row in enumerate(csv.reader(csv_file), start=1):
+        if not row or row[0].startswith('#'):
+            continue
+        try:
+            yield _parse_row(row)
+        except ValueError as e:
+            if line_no == 1:
+                continue  # header
+            raise ValueError(f'line {line_no}: {e}') from e
+
+
+def compile_index(ranges, output_path):
+    """Write ``ranges`` to ``output_path`` as a binary index; return the record count.
+
+    The file is written to a temporary name and renamed into place, so
+    processes that already mapped the old index are unaffected until they
+    remap it.
+    """
+    ranges = sorted(ranges)
+    cities = {}
+    for previous, current in zip(ranges, ranges[1:]):
+        if current[0] <= previous[1]:
+            raise ValueError(f'overlapping ranges for {previous[2]!r} and {current[2]!r}')
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.geoip-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(b'\x00' * HEADER.size)
+            for start, end, city in ranges:
+                city_id = cities.setdefault(city, len(cities))
+                out.write(RECORD.pack(start.to_bytes(16, 'big'), end.to_bytes(16, 'big'), city_id))
+            for city in cities:
+                encoded = city.encode('utf-8')
+                out.write(CITY_LENGTH.pack(len(encoded)))
+                out.write(encoded)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, len(ranges), len(cities)))
+            # mkstemp creates the file 0600; workers may run as another user
+            os.fchmod(out.fileno(), 0o644)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(ranges)
+
+
+def _identity(stat):
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class GeoIPIndex:
+    """Read-only view of a compiled index; lookups are a binary search over the map."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.identity = _identity(os.fstat(f.fileno()))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.record_count, city_count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a GeoIP index')
+            offset = HEADER.size + self.record_count * RECORD.size
+            self.cities = []
+            for _ in range(city_count):
+                (length,) = CITY_LENGTH.unpack_from(self._map, offset)
+                offset += CITY_LENGTH.size
+                self.cities.append(self._map[offset:offset + length].decode('utf-8'))
+                offset += length
+            if offset != len(self._map):
+                raise ValueError(f'{path} is truncated or corrupt')
+        except BaseException:
+            self._map.close()
+            raise
+
+    def _start(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return int.from_bytes(self._map[offset:offset + 16], 'big')
+
+    def lookup(self, ip):
+        """Return the city containing ``ip``, or None if it is not covered."""
+        try:
+            key = ip_to_int(ip)
+        except ValueError:
+            return None
+
+        # Find the last record whose start is <= key
+        lo, hi = 0, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._start(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        _, end, city_id = RECORD.unpack_from(self._map, HEADER.size + (lo - 1) * RECORD.size)
+        if key > int.from_bytes(end, 'big'):
+            return None
+        return self.cities[city_id]
+
+    def close(self):
+        self._map.close()
+
+
+_index = None
+_index_checked_at = 0.0
+_index_failed_at = None
+_index_error = None
+_index_lock = threading.Lock()
+
+
+def _load(path):
+    """Map the index at ``path``, or log why it cannot be (once per error) and return None."""
+    global _index_error
+    try:
+        index = GeoIPIndex(path)
+    except (OSError, ValueError, struct.error) as e:
+        if str(e) != _index_error:
+            _index_error = str(e)
+            logger.error('Cannot load GeoIP index %s: %s', path, e)
+        return None
+    _index_error = None
+    return index
+
+
+def get_index():
+    """Return the process-wide index at ``settings.GEOIP_INDEX_PATH``, mapping it on first use.
+
+    Every ``RELOAD_CHECK_INTERVAL`` seconds the file's inode and mtime are
+    compared with the mapped one and a rebuilt index is mapped in its place.
+    The old map is left to be closed by garbage collection, since lookups in
+    other threads may still be reading it. Returns None while no index can
+    be loaded (missing, truncated or corrupt file), retrying every
+    ``RELOAD_CHECK_INTERVAL`` seconds; a rebuild that cannot be loaded
+    leaves the mapped index in service.
+    """
+    global _index, _index_checked_at, _index_failed_at
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < RELOAD_CHECK_INTERVAL:
+        return _index
+    if _index is None and _index_failed_at is not None and now - _index_failed_at < RELOAD_CHECK_INTERVAL:
+        return None
+    with _index_lock:
+        if _index is None:
+            if _index_failed_at is None or now - _index_failed_at >= RELOAD_CHECK_INTERVAL:
+                _index = _load(settings.GEOIP_INDEX_PATH)
+                _index_failed_at = None if _index is not None else now
+                _index_checked_at = now
+        elif now - _index_checked_at >= RELOAD_CHECK_INTERVAL:
+            path = settings.GEOIP_INDEX_PATH
+            try:
+                changed = _identity(os.stat(path)) != _index.identity
+            except OSError:
+                changed = False  # keep serving the mapped index if the file is gone
+            if changed:
+                _index = _load(path) or _index
+            _index_checked_at = now
+    return _index
+
+
+def lookup(ip):
+    """Return the city for ``ip``, or None if it is not covered or no index is available."""
+    index = get_index()
+    return index.lookup(ip) if index is not None else None
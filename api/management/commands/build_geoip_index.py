@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import geoip
+
+
+class Command(BaseCommand):
+    help = 'Compile an IP-range-to-city CSV into the memory-mapped GeoIP index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV of "network,city" or "start_ip,end_ip,city" rows')
+        parser.add_argument('--output', default=settings.GEOIP_INDEX_PATH,
+                            help='Index file to write (default: settings.GEOIP_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8') as csv_file:
+                count = geoip.compile_index(geoip.read_ranges(csv_file), options['output'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} ranges to {options['output']} in {elapsed:.2f}s"
+        ))
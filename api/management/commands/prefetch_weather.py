@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import prefetch, views
+
+
+class SeededHotKeys:
+    """The shared hot-city list, with cities given on the command line first."""
+
+    def __init__(self, cities, hot_keys):
+        self.cities = cities
+        self.hot_keys = hot_keys
+
+    def top(self, n=None):
+        items = [(city, None) for city in self.cities]
+        items += [item for item in self.hot_keys.top() if item[0] not in self.cities]
+        return items[:n] if n else items
+
+
+class Command(BaseCommand):
+    help = ('Refresh weather for the cities the serving workers see most, in the shared '
+            'weather cache (WEATHER_SHARED_CACHE). Cities given with --city are always '
+            'refreshed; use --once to run a single cycle and report.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', action='append', default=[], help='City to keep warm (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Run one refresh cycle and exit')
+
+    def handle(self, *args, **options):
+        if views.shared_hot_cities is None:
+            raise CommandError('WEATHER_SHARED_CACHE is not set; without it this process cannot '
+                               'warm the serving workers\' weather cache')
+        hot_keys = SeededHotKeys(options['city'], views.shared_hot_cities)
+        prefetcher = prefetch.WeatherPrefetcher(
+            views.weather_cache,
+            hot_keys,
+            interval=settings.WEATHER_PREFETCH_INTERVAL,
+            refresh_ahead=settings.WEATHER_PREFETCH_AHEAD,
+            max_calls=settings.WEATHER_PREFETCH_MAX_CALLS,
+            min_call_interval=settings.WEATHER_PREFETCH_MIN_CALL_INTERVAL,
+        )
+
+        if not options['once']:
+            self.stdout.write(f'Refreshing hot cities every {prefetcher.interval}s; Ctrl-C to stop')
+            try:
+                prefetcher.run_forever()
+            except KeyboardInterrupt:
+                prefetcher.stop()
+            return
+
+        started = time.monotonic()
+        calls = prefetcher.run_once()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{calls} upstream calls, {prefetcher.errors} errors in {elapsed:.2f}s')
+        for city, count in hot_keys.top():
+            self.stdout.write(f'  {city}: ~{count} requests' if count is not None else f'  {city}')
@@ -0,0 +1,202 @@
+import heapq
+import random
+import threading
+import time
+
+_PRIME = (1 << 61) - 1
+
+
+class CountMinSketch:
+    """Fixed-size frequency sketch; estimates never under-count.
+
+    Counters are halved once ``decay_after`` additions have been made so
+    estimates follow recent traffic rather than all-time totals.
+    """
+
+    def __init__(self, width=1024, depth=4, decay_after=None):
+        self.width = width
+        self.depth = depth
+        self.decay_after = decay_after or width * 10
+        # Independent universal hash functions ((a * h + b) mod p) mod width per row
+        self._hashes = [(random.randrange(1, _PRIME), random.randrange(_PRIME)) for _ in range(depth)]
+        self._rows = [[0] * width for _ in range(depth)]
+        self._additions = 0
+        self.decays = 0
+
+    def _cells(self, key):
+        h = hash(key)
+        return [((a * h + b) % _PRIME) % self.width for a, b in self._hashes]
+
+    def add(self, key, count=1):
+        """Count ``key`` and return its new estimate."""
+        estimate = None
+        for row, cell in zip(self._rows, self._cells(key)):
+            row[cell] += count
+            estimate = row[cell] if estimate is None else min(estimate, row[cell])
+        self._additions += count
+        if self._additions >= self.decay_after:
+            self.decay()
+        return estimate
+
+    def estimate(self, key):
+        return min(row[cell] for row, cell in zip(self._rows, self._cells(key)))
+
+    def decay(self):
+        for row in self._rows:
+            for i, value in enumerate(row):
+                row[i] = value >> 1
+        self._additions = 0
+        self.decays += 1
+
+
+class HotKeys:
+    """Track the ``k`` most frequently seen keys using a count-min sketch.
+
+    Memory is bounded by the sketch size plus ``k`` candidate keys,
+    regardless of how many distinct keys are seen. Candidate counts are
+    halved along with the sketch, so keys that have gone cold can be
+    displaced by new ones.
+    """
+
+    def __init__(self, k=50, width=1024, depth=4):
+        self.k = k
+        self._sketch = CountMinSketch(width, depth)
+        self._candidates = {}
+        self._lock = threading.Lock()
+
+    def record(self, key):
+        with self._lock:
+            decays = self._sketch.decays
+            estimate = self._sketch.add(key)
+            if self._sketch.decays != decays:
+                for candidate, count in self._candidates.items():
+                    self._candidates[candidate] = count >> (self._sketch.decays - decays)
+                estimate = self._sketch.estimate(key)
+            if key in self._candidates or len(self._candidates) < self.k:
+                self._candidates[key] = estimate
+                return
+            coldest = min(self._candidates, key=self._candidates.get)
+            if estimate > self._candidates[coldest]:
+                del self._candidates[coldest]
+                self._candidates[key] = estimate
+
+    def top(self, n=None):
+        """Return ``[(key, estimate), ...]`` hottest first."""
+        with self._lock:
+            items = [(key, self._sketch.estimate(key)) for key in self._candidates]
+        return heapq.nlargest(n or self.k, items, key=lambda item: item[1])
+
+
+class PublishedHotKeys:
+    """Hot keys merged from several processes through a shared Django cache.
+
+    Each serving process calls ``publish()`` with its own ``HotKeys``; at
+    most once per ``interval`` seconds its top keys are merged into one list
+    stored under ``key``. ``top()`` returns that list, so a separate process
+    can prefetch for all of them. Keys not republished for ``ttl`` seconds
+    drop out. Concurrent publishes may overwrite each other; the lost keys
+    return on the next publish.
+    """
+
+    def __init__(self, backend, k=50, key='api.prefetch.hot', interval=30, ttl=300, timer=time.time):
+        self.backend = backend
+        self.k = k
+        self.key = key
+        self.interval = interval
+        self.ttl = ttl
+        self._timer = timer
+        self._next_publish = 0
+        self._lock = threading.Lock()
+
+    def _entries(self, now):
+        return {
+            key: (count, seen)
+            for key, count, seen in self.backend.get(self.key, [])
+            if now - seen < self.ttl
+        }
+
+    def publish(self, hot_keys):
+        """Merge ``hot_keys.top()`` into the shared list if ``interval`` has passed."""
+        now = self._timer()
+        with self._lock:
+            if now < self._next_publish:
+                return False
+            self._next_publish = now + self.interval
+        entries = self._entries(now)
+        for key, count in hot_keys.top():
+            entries[key] = (count, now)
+        hottest = heapq.nlargest(self.k, entries.items(), key=lambda item: item[1][0])
+        self.backend.set(self.key, [(key, count, seen) for key, (count, seen) in hottest], self.ttl)
+        return True
+
+    def top(self, n=None):
+        """Return ``[(key, estimate), ...]`` hottest first."""
+        entries = self._entries(self._timer())
+        items = [(key, count) for key, (count, _) in entries.items()]
+        return heapq.nlargest(n or self.k, items, key=lambda item: item[1])
+
+
+class WeatherPrefetcher:
+    """Refresh the hottest cities in a ``StaleWhileRevalidateCache`` before they go stale.
+
+    Each cycle refreshes hot cities that are missing or within
+    ``refresh_ahead`` seconds of going stale, hottest first, spending at most
+    ``max_calls`` upstream calls and spacing them ``min_call_interval``
+    seconds apart. The budget is per prefetcher: every process running one
+    spends its own ``max_calls``.
+    """
+
+    def __init__(self, cache, hot_keys, interval=30, refresh_ahead=60, max_calls=20,
+                 min_call_interval=0.1, sleep=time.sleep):
+        self.cache = cache
+        self.hot_keys = hot_keys
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.max_calls = max_calls
+        self.min_call_interval = min_call_interval
+        self._sleep = sleep
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def due(self):
+        """Return the hot keys that need refreshing this cycle, hottest first."""
+        due = []
+        for key, _ in self.hot_keys.top():
+            expires_in = self.cache.expires_in(key)
+            if expires_in is None or expires_in <= self.refresh_ahead:
+                due.append(key)
+        return due[:self.max_calls]
+
+    def run_once(self):
+        """Run one refresh cycle and return the number of upstream calls made."""
+        calls = 0
+        for key in self.due():
+            if calls:
+                self._sleep(self.min_call_interval)
+            calls += 1
+            try:
+                self.cache.refresh(key)
+            except Exception:
+                self.errors += 1
+        self.calls += calls
+        return calls
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def ensure_started(self):
+        """Start the background refresh thread once per process."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run_forever, name='weather-prefetch', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -3,4 +3,8 @@ from rest_framework import serializers
 class HelloSerializer(serializers.Serializer):
     client_ip = serializers.CharField()
     location = serializers.CharField()
-    greeting = serializers.CharField()
\ No newline at end of file
+    greeting = serializers.CharField()
+
+class HelloBatchItemSerializer(serializers.Serializer):
+    visitor_name = serializers.CharField(required=False, default='Guest')
+    ip = serializers.IPAddressField()
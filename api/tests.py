@@ -1,3 +1,530 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import requests
+from unittest.mock import patch, AsyncMock, MagicMock
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from .cache import TTLCache, SharedCache, StaleWhileRevalidateCache, MISSING
+from hng1 import timing
+from . import aio, geoip, prefetch, upstream, views
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_hit_and_miss_counters(self):
+        self.assertIs(self.cache.get('a'), MISSING)
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.timer.now = 10
+        self.assertIs(self.cache.get('a'), MISSING)
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_per_entry_ttl(self):
+        self.cache.set('a', 1, ttl=2)
+        self.timer.now = 3
+        self.assertIs(self.cache.get('a'), MISSING)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIs(self.cache.get('b'), MISSING)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class CityLookupCacheTests(SimpleTestCase):
+    def setUp(self):
+        views.city_cache.clear()
+
+    def test_repeat_ip_uses_cache(self):
+        fetch = MagicMock(return_value='Lagos')
+        with patch.object(views, 'fetch_city', fetch):
+            self.assertEqual(views.get_city_from_ip('1.2.3.4'), 'Lagos')
+            self.assertEqual(views.get_city_from_ip('1.2.3.4'), 'Lagos')
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_failed_lookup_is_negatively_cached(self):
+        fetch = MagicMock(side_effect=upstream.UpstreamError('boom'))
+        with patch.object(views, 'fetch_city', fetch):
+            self.assertEqual(views.get_city_from_ip('1.2.3.4'), 'Unknown')
+            self.assertEqual(views.get_city_from_ip('1.2.3.4'), 'Unknown')
+        self.assertEqual(fetch.call_count, 1)
+
+
+class StaleWhileRevalidateCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.calls = []
+
+    def loader(self, key):
+        self.calls.append(key)
+        return len(self.calls)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_loader(key):
+            self.calls.append(key)
+            started.set()
+            release.wait(5)
+            return 21
+
+        cache = StaleWhileRevalidateCache(slow_loader, timer=self.timer)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('Lagos'))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [21] * 5)
+        self.assertEqual(self.calls, ['Lagos'])
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        cache = StaleWhileRevalidateCache(self.loader, ttl=10, stale_ttl=10, timer=self.timer)
+        self.assertEqual(cache.get('Lagos'), 1)
+        self.timer.now = 15
+        with patch.object(cache, 'refresh_async') as refresh_async:
+            self.assertEqual(cache.get('Lagos'), 1)
+        refresh_async.assert_called_once_with('Lagos')
+
+    def test_entry_past_stale_window_is_reloaded(self):
+        cache = StaleWhileRevalidateCache(self.loader, ttl=10, stale_ttl=10, timer=self.timer)
+        cache.get('Lagos')
+        self.timer.now = 25
+        self.assertEqual(cache.get('Lagos'), 2)
+
+    def test_loader_errors_are_not_cached(self):
+        cache = StaleWhileRevalidateCache(MagicMock(side_effect=ValueError), timer=self.timer)
+        with self.assertRaises(ValueError):
+            cache.get('Lagos')
+        self.assertIs(cache.peek('Lagos'), MISSING)
+
+
+class AsyncHelloTests(SimpleTestCase):
+    def setUp(self):
+        views.city_cache.clear()
+        views.weather_cache.clear()
+        self.factory = AsyncRequestFactory()
+        access = patch.object(views, 'check_access', return_value=None)
+        access.start()
+        self.addCleanup(access.stop)
+
+    async def test_hello_async_greets_visitor(self):
+        request = self.factory.get('/api/hello', {'visitor_name': 'Mark'}, headers={'X-Real-IP': '1.2.3.4'})
+        with patch.object(views, 'fetch_city_async', AsyncMock(return_value='Lagos')), \
+                patch.object(views, 'fetch_temperature_async', AsyncMock(return_value=30.5)):
+            response = await views.hello_async(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {
+            'client_ip': '1.2.3.4',
+            'location': 'Lagos',
+            'greeting': 'Hello, Mark! The temperature is 30.5 degrees Celsius in Lagos.',
+        })
+
+    async def test_hello_async_falls_back_on_upstream_timeout(self):
+        request = self.factory.get('/api/hello', headers={'X-Real-IP': '1.2.3.4'})
+        with patch.object(views, 'fetch_city_async', AsyncMock(side_effect=upstream.UpstreamError('timeout'))), \
+                patch.object(views, 'fetch_temperature_async', AsyncMock(side_effect=upstream.UpstreamError('timeout'))):
+            response = await views.hello_async(request)
+        self.assertEqual(json.loads(response.content)['location'], 'Unknown')
+
+    async def test_concurrent_async_lookups_are_coalesced(self):
+        fetch = AsyncMock(return_value='Lagos')
+        with patch.object(views, 'fetch_city_async', fetch):
+            cities = await asyncio.gather(*[views.get_city_from_ip_async('1.2.3.4') for _ in range(10)])
+        self.assertEqual(cities, ['Lagos'] * 10)
+        self.assertEqual(fetch.await_count, 1)
+
+
+class AsyncHelloAuthenticationTests(SimpleTestCase):
+    async def test_requests_without_credentials_are_refused(self):
+        request = AsyncRequestFactory().get('/api/hello', headers={'X-Real-IP': '1.2.3.4'})
+        with patch.object(views, 'fetch_city_async', AsyncMock()) as fetch:
+            response = await views.hello_async(request)
+        self.assertEqual(response.status_code, 401)
+        fetch.assert_not_awaited()
+
+
+class AsyncSessionTests(SimpleTestCase):
+    def test_session_is_closed_when_its_loop_shuts_down(self):
+        async def open_session():
+            return aio.get_session()
+
+        self.assertTrue(asyncio.run(open_session()).closed)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.breaker = upstream.CircuitBreaker(failure_threshold=2, reset_timeout=30, timer=self.timer)
+
+    def test_opens_after_threshold_and_half_opens_after_timeout(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.timer.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_call_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.timer.now = 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_unresolved_trial_is_replaced_after_the_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.timer.now = 30
+        self.assertEqual(self.breaker.allow(), upstream.CircuitBreaker.HALF_OPEN)
+        self.timer.now = 59
+        self.assertIsNone(self.breaker.allow())
+        self.timer.now = 60
+        self.assertEqual(self.breaker.allow(), upstream.CircuitBreaker.HALF_OPEN)
+
+
+class UpstreamClientTests(SimpleTestCase):
+    def setUp(self):
+        self.client = upstream.UpstreamClient('test', 'http://upstream.test', timeout=1, retries=2, backoff=0,
+                                              breaker=upstream.CircuitBreaker(failure_threshold=3))
+
+    def response(self, status_code, data=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(data or {}).encode()
+        return response
+
+    def test_retries_server_errors(self):
+        responses = [self.response(503), self.response(200, {'ok': True})]
+        with patch.object(self.client.session, 'get', side_effect=responses) as get:
+            self.assertEqual(self.client.get_json('/x'), {'ok': True})
+        self.assertEqual(get.call_count, 2)
+
+    def test_client_errors_are_not_retried_or_counted(self):
+        with patch.object(self.client.session, 'get', return_value=self.response(400)) as get:
+            with self.assertRaises(upstream.UpstreamError):
+                self.client.get_json('/x')
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    def test_open_circuit_fails_fast(self):
+        with patch.object(self.client.session, 'get', side_effect=requests.exceptions.ConnectionError) as get:
+            with self.assertRaises(upstream.UpstreamError):
+                self.client.get_json('/x')
+            with self.assertRaises(upstream.CircuitOpenError):
+                self.client.get_json('/x')
+        self.assertEqual(get.call_count, 3)
+
+    def open_circuit(self):
+        self.client.breaker = upstream.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.client.breaker.record_failure()
+
+    def test_client_error_in_the_trial_call_closes_the_circuit(self):
+        self.open_circuit()
+        with patch.object(self.client.session, 'get', return_value=self.response(404)):
+            with self.assertRaises(upstream.UpstreamError):
+                self.client.get_json('/x')
+        self.assertEqual(self.client.breaker.state, upstream.CircuitBreaker.CLOSED)
+
+    def test_trial_call_without_a_response_reopens_the_circuit(self):
+        self.open_circuit()
+        with upstream.deadline_scope(0):
+            with self.assertRaises(upstream.DeadlineExceeded):
+                self.client.get_json('/x')
+        self.assertEqual(self.client.breaker.state, upstream.CircuitBreaker.OPEN)
+
+    def test_attempts_stop_at_the_deadline(self):
+        with upstream.deadline_scope(0):
+            with self.assertRaises(upstream.DeadlineExceeded):
+                self.client.get_json('/x')
+
+    def test_calls_are_timed_under_the_client_name(self):
+        timings = timing.Timings()
+        token = timing._current.set(timings)
+        self.addCleanup(timing._current.reset, token)
+        responses = [self.response(503), self.response(200)]
+        with patch.object(self.client.session, 'get', side_effect=responses):
+            self.client.get_json('/x')
+        self.assertEqual(timings.metrics['test'][1], 2)
+
+
+class GeoIPIndexTests(SimpleTestCase):
+    CSV = (
+        'network,city\n'
+        '102.91.0.0/16,Lagos\n'
+        '8.8.8.0/24,Mountain View\n'
+        '2001:db8::/32,Berlin\n'
+    )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'geoip.idx')
+        geoip.compile_index(geoip.read_ranges(io.StringIO(self.CSV)), self.path)
+        self.index = geoip.GeoIPIndex(self.path)
+        self.addCleanup(self.index.close)
+
+    def test_lookup_ipv4_and_ipv6(self):
+        self.assertEqual(self.index.lookup('102.91.93.2'), 'Lagos')
+        self.assertEqual(self.index.lookup('8.8.8.255'), 'Mountain View')
+        self.assertEqual(self.index.lookup('2001:db8::1'), 'Berlin')
+
+    def test_addresses_outside_every_range(self):
+        self.assertIsNone(self.index.lookup('8.8.9.0'))
+        self.assertIsNone(self.index.lookup('1.1.1.1'))
+        self.assertIsNone(self.index.lookup('::1'))
+        self.assertIsNone(self.index.lookup('not-an-ip'))
+
+    def test_start_end_rows_and_overlap_detection(self):
+        ranges = list(geoip.read_ranges(io.StringIO('10.0.0.0,10.0.0.9,A\n10.0.0.5,10.0.0.20,B\n')))
+        with self.assertRaises(ValueError):
+            geoip.compile_index(ranges, self.path)
+
+    def test_management_command_builds_index(self):
+        csv_path = os.path.join(os.path.dirname(self.path), 'ranges.csv')
+        with open(csv_path, 'w') as f:
+            f.write(self.CSV)
+        output = os.path.join(os.path.dirname(self.path), 'built.idx')
+        call_command('build_geoip_index', csv_path, output=output, stdout=io.StringIO())
+        index = geoip.GeoIPIndex(output)
+        self.addCleanup(index.close)
+        self.assertEqual(index.lookup('102.91.1.1'), 'Lagos')
+
+    def test_index_is_world_readable(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    def test_rebuilt_index_is_remapped(self):
+        self.addCleanup(setattr, geoip, '_index', None)
+        geoip._index = None
+        with override_settings(GEOIP_INDEX_PATH=self.path), patch.object(geoip, 'RELOAD_CHECK_INTERVAL', 0):
+            self.assertEqual(geoip.get_index().lookup('102.91.93.2'), 'Lagos')
+            geoip.compile_index(geoip.read_ranges(io.StringIO('102.91.0.0/16,Abuja\n')), self.path)
+            self.assertEqual(geoip.get_index().lookup('102.91.93.2'), 'Abuja')
+
+    @override_settings(GEOIP_BACKEND='local')
+    def test_unusable_index_falls_back_to_unknown(self):
+        for name in ('_index', '_index_failed_at', '_index_error'):
+            self.addCleanup(setattr, geoip, name, None)
+        with open(self.path, 'rb') as f:
+            truncated = os.path.join(os.path.dirname(self.path), 'truncated.idx')
+            with open(truncated, 'wb') as out:
+                out.write(f.read()[:-3])
+        missing = os.path.join(os.path.dirname(self.path), 'missing.idx')
+
+        for path in (missing, truncated):
+            geoip._index = geoip._index_failed_at = None
+            with override_settings(GEOIP_INDEX_PATH=path), self.assertLogs('api.geoip', 'ERROR') as logs:
+                self.assertEqual(views.get_city_from_ip('102.91.93.2'), 'Unknown')
+                self.assertEqual(views.get_city_from_ip('102.91.93.2'), 'Unknown')
+            self.assertEqual(len(logs.records), 1)
+
+        # The file is retried once RELOAD_CHECK_INTERVAL has passed
+        with override_settings(GEOIP_INDEX_PATH=self.path), patch.object(geoip, 'RELOAD_CHECK_INTERVAL', 0):
+            self.assertEqual(views.get_city_from_ip('102.91.93.2'), 'Lagos')
+
+    @override_settings(GEOIP_BACKEND='local')
+    def test_local_backend_skips_remote_lookup(self):
+        with patch.object(geoip, 'get_index', return_value=self.index), \
+                patch.object(views, 'fetch_city') as fetch:
+            self.assertEqual(views.get_city_from_ip('102.91.93.2'), 'Lagos')
+            self.assertEqual(views.get_city_from_ip('1.1.1.1'), 'Unknown')
+        fetch.assert_not_called()
+
+
+class HotKeysTests(SimpleTestCase):
+    def test_tracks_most_frequent_keys_within_bound(self):
+        hot = prefetch.HotKeys(k=2)
+        for city, count in [('Lagos', 50), ('Abuja', 30), ('Kano', 5)]:
+            for _ in range(count):
+                hot.record(city)
+        for i in range(100):
+            hot.record(f'rare-{i}')
+        self.assertEqual([city for city, _ in hot.top()], ['Lagos', 'Abuja'])
+
+    def test_sketch_never_undercounts(self):
+        sketch = prefetch.CountMinSketch(width=8, depth=2, decay_after=10 ** 6)
+        for i in range(100):
+            sketch.add(i % 10)
+        self.assertTrue(all(sketch.estimate(i) >= 10 for i in range(10)))
+
+    def test_follows_traffic_to_new_keys(self):
+        hot = prefetch.HotKeys(k=2)
+        for _ in range(20000):
+            hot.record('Lagos')
+            hot.record('Abuja')
+        for i in range(100000):
+            hot.record(f'new-{i % 10}')
+        self.assertTrue(all(city.startswith('new-') for city, _ in hot.top()))
+
+
+class WeatherPrefetcherTests(SimpleTestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.loader = MagicMock(return_value=20)
+        self.cache = StaleWhileRevalidateCache(self.loader, ttl=100, stale_ttl=100, timer=self.timer)
+        self.hot = prefetch.HotKeys(k=3)
+        for city, count in [('Lagos', 3), ('Abuja', 2), ('Kano', 1)]:
+            for _ in range(count):
+                self.hot.record(city)
+
+    def test_refreshes_missing_and_expiring_entries_within_budget(self):
+        prefetcher = prefetch.WeatherPrefetcher(self.cache, self.hot, refresh_ahead=10, max_calls=2,
+                                                sleep=lambda _: None)
+        self.assertEqual(prefetcher.run_once(), 2)
+        self.assertEqual([c.args[0] for c in self.loader.call_args_list], ['Lagos', 'Abuja'])
+
+        self.loader.reset_mock()
+        self.assertEqual(prefetcher.run_once(), 1)
+        self.loader.assert_called_once_with('Kano')
+
+        self.loader.reset_mock()
+        self.timer.now = 95
+        self.assertEqual(prefetcher.run_once(), 2)
+        self.assertEqual([c.args[0] for c in self.loader.call_args_list], ['Lagos', 'Abuja'])
+
+
+class SharedWeatherCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = LocMemCache('shared-weather-tests', {})
+        self.backend.clear()
+        self.timer = FakeTimer()
+        self.loader = MagicMock(return_value=20)
+
+    def weather_cache(self):
+        store = SharedCache(self.backend, 'weather', ttl=200)
+        return StaleWhileRevalidateCache(self.loader, ttl=100, stale_ttl=100, timer=self.timer, store=store)
+
+    def test_entries_are_shared_between_caches(self):
+        self.weather_cache().get('Lagos')
+        worker = self.weather_cache()
+        self.assertEqual(worker.get('Lagos'), 20)
+        self.assertEqual(worker.expires_in('Lagos'), 100)
+        self.loader.assert_called_once_with('Lagos')
+
+    def test_published_hot_keys_are_merged(self):
+        published = prefetch.PublishedHotKeys(self.backend, k=2, interval=30, timer=self.timer)
+        first, second = prefetch.HotKeys(), prefetch.HotKeys()
+        for city, count in [('Lagos', 3), ('Kano', 1)]:
+            for _ in range(count):
+                first.record(city)
+        for _ in range(2):
+            second.record('Abuja')
+        self.assertTrue(published.publish(first))
+        self.assertFalse(published.publish(second))  # within the interval
+        self.timer.now = 30
+        self.assertTrue(prefetch.PublishedHotKeys(self.backend, k=2, timer=self.timer).publish(second))
+        self.assertEqual(published.top(), [('Lagos', 3), ('Abuja', 2)])
+
+    def test_command_warms_the_shared_cache(self):
+        hot = prefetch.HotKeys()
+        hot.record('Lagos')
+        published = prefetch.PublishedHotKeys(self.backend, timer=self.timer)
+        published.publish(hot)
+        with patch.object(views, 'weather_cache', self.weather_cache()), \
+                patch.object(views, 'shared_hot_cities', published):
+            out = io.StringIO()
+            call_command('prefetch_weather', city=['Kano'], once=True, stdout=out)
+        self.assertIn('2 upstream calls', out.getvalue())
+        worker = self.weather_cache()
+        self.assertEqual((worker.get('Kano'), worker.get('Lagos')), (20, 20))
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_command_needs_a_shared_cache(self):
+        with patch.object(views, 'shared_hot_cities', None), self.assertRaises(CommandError):
+            call_command('prefetch_weather', once=True, stdout=io.StringIO())
+
+
+class HelloBatchTests(SimpleTestCase):
+    def setUp(self):
+        views.city_cache.clear()
+        views.weather_cache.clear()
+
+    def post(self, payload):
+        request = APIRequestFactory().post('/api/hello/batch', payload, format='json')
+        force_authenticate(request, user=MagicMock(is_authenticated=True))
+        return views.hello_batch(request)
+
+    def test_lookups_are_deduplicated(self):
+        cities = {'1.1.1.1': 'Lagos', '2.2.2.2': 'Lagos', '3.3.3.3': 'Abuja'}
+        fetch_city = MagicMock(side_effect=cities.get)
+        fetch_temperature = MagicMock(side_effect={'Lagos': 30, 'Abuja': 25}.get)
+        payload = [
+            {'visitor_name': 'Ada', 'ip': '1.1.1.1'},
+            {'visitor_name': 'Obi', 'ip': '1.1.1.1'},
+            {'visitor_name': 'Ngozi', 'ip': '2.2.2.2'},
+            {'ip': '3.3.3.3'},
+        ]
+        with patch.object(views, 'fetch_city', fetch_city), \
+                patch.object(views.weather_cache, 'loader', fetch_temperature):
+            response = self.post(payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(fetch_city.call_count, 3)
+        self.assertEqual(sorted(c.args[0] for c in fetch_temperature.call_args_list), ['Abuja', 'Lagos'])
+        self.assertEqual(response.data[1], {
+            'client_ip': '1.1.1.1',
+            'location': 'Lagos',
+            'greeting': 'Hello, Obi! The temperature is 30 degrees Celsius in Lagos.',
+        })
+        self.assertEqual(response.data[3]['greeting'], 'Hello, Guest! The temperature is 25 degrees Celsius in Abuja.')
+
+    def test_invalid_items_are_rejected(self):
+        response = self.post([{'visitor_name': 'Ada', 'ip': 'nope'}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['errors'][0]['field'], '0.ip')
+
+        response = self.post({'ip': '1.1.1.1'})
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(HELLO_BATCH_MAX_ITEMS=1)
+    def test_batch_size_is_bounded(self):
+        response = self.post([{'ip': '1.1.1.1'}, {'ip': '2.2.2.2'}])
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(HELLO_BATCH_MAX_ITEMS=1)
+    def test_oversized_batch_is_rejected_before_validation(self):
+        with patch.object(views, 'HelloBatchItemSerializer') as serializer:
+            response = self.post([{'ip': 'nope'}, {'ip': 'nope'}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['errors'][0]['field'], 'non_field_errors')
+        serializer.assert_not_called()
+
+    def test_lookups_cut_off_by_the_deadline_are_not_cached(self):
+        with patch.object(views, 'fetch_city', side_effect=upstream.DeadlineExceeded('deadline')):
+            self.assertEqual(views.get_city_from_ip('1.1.1.1'), 'Unknown')
+        self.assertIs(views.city_cache.get('1.1.1.1'), MISSING)
@@ -0,0 +1,290 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from hng1 import metrics, timing
+
+from . import aio
+
+
+class UpstreamError(Exception):
+    """An upstream call failed or was not attempted."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The upstream is failing and calls are being short-circuited."""
+
+
+class DeadlineExceeded(UpstreamError):
+    """The request's upstream time budget ran out."""
+
+
+class Deadline:
+    """A time budget shared by every upstream call made for one request."""
+
+    def __init__(self, budget, timer=time.monotonic):
+        self._timer = timer
+        self.expires_at = timer() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self._timer())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+_current_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline_scope(budget):
+    """Apply a shared ``Deadline`` to upstream calls made inside the block."""
+    deadline = Deadline(budget)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``reset_timeout`` seconds. One trial call is then let
+    through; its outcome closes or re-opens the circuit. A trial whose outcome
+    is never recorded is replaced by a new one after another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, timer=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._timer = timer
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        """Return None to refuse a call, else the state it runs in (``HALF_OPEN`` for the trial)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return self.CLOSED
+            now = self._timer()
+            if now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return self.HALF_OPEN
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self._timer()
+
+
+UPSTREAM_SECONDS = metrics.Histogram('upstream_request_duration_seconds',
+                                     'Duration of each upstream HTTP attempt.', ('upstream',))
+UPSTREAM_ERRORS = metrics.Counter('upstream_errors_total', 'Failed upstream HTTP attempts.', ('upstream',))
+UPSTREAM_SHORT_CIRCUITS = metrics.Counter('upstream_short_circuits_total',
+                                          'Upstream calls refused by an open circuit.', ('upstream',))
+
+
+def _status(exc):
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is None:
+        status = getattr(exc, 'status', None)
+    return status
+
+
+def _is_retryable(exc):
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        aiohttp.ServerConnectionError, asyncio.TimeoutError)):
+        return True
+    status = _status(exc)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _is_client_error(exc):
+    status = _status(exc)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+class UpstreamClient:
+    """Pooled JSON client for one upstream API.
+
+    Calls are bounded by the per-call ``timeout`` and by the deadline of the
+    current ``deadline_scope``. Connection errors, timeouts, 429 and 5xx
+    responses are retried up to ``retries`` times with full-jitter backoff and
+    count towards the circuit breaker; other errors are raised immediately.
+    All failures surface as ``UpstreamError``.
+
+    A non-retryable 4xx answer means the upstream is up, so it counts as a
+    success for the circuit. The half-open trial call always records an
+    outcome: anything other than a response or a 4xx (deadline, bad JSON,
+    cancellation) re-opens the circuit.
+    """
+
+    def __init__(self, name, base_url, timeout, retries=2, backoff=0.1, breaker=None, pool_size=10):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @contextlib.contextmanager
+    def _attempt(self):
+        """Time one HTTP attempt for Server-Timing and the metrics, counting failures."""
+        started = time.perf_counter()
+        try:
+            with timing.timed(self.name):
+                yield
+        except Exception:
+            UPSTREAM_ERRORS.inc(self.name)
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.name)
+
+    def _check_circuit(self):
+        """Raise ``CircuitOpenError`` or return whether this call is the half-open trial."""
+        state = self.breaker.allow()
+        if state is None:
+            UPSTREAM_SHORT_CIRCUITS.inc(self.name)
+            raise CircuitOpenError(f'{self.name}: circuit open')
+        return state == CircuitBreaker.HALF_OPEN
+
+    def _attempt_timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'{self.name}: deadline exceeded')
+        return min(self.timeout, remaining)
+
+    def _backoff_delay(self, attempt, deadline):
+        """Return the jittered delay before the next attempt, or None to give up."""
+        if attempt >= self.retries:
+            return None
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+        return delay
+
+    @staticmethod
+    def _give_up_error(deadline):
+        """``DeadlineExceeded`` if the last attempt was cut short by the deadline, else ``UpstreamError``."""
+        return DeadlineExceeded if deadline is not None and deadline.expired else UpstreamError
+
+    def get_json(self, path, params=None):
+        deadline = _current_deadline.get()
+        trial = self._check_circuit()
+        recorded = False
+        attempt = 0
+        try:
+            while True:
+                try:
+                    timeout = self._attempt_timeout(deadline)
+                    with self._attempt():
+                        response = self.session.get(self.base_url + path, params=params, timeout=timeout)
+                        response.raise_for_status()
+                        data = response.json()
+                except requests.exceptions.RequestException as e:
+                    if not _is_retryable(e):
+                        if _is_client_error(e):
+                            self.breaker.record_success()
+                            recorded = True
+                        raise UpstreamError(f'{self.name}: {e}') from e
+                    self.breaker.record_failure()
+                    recorded = True
+                    delay = None if trial else self._backoff_delay(attempt, deadline)
+                    if delay is None:
+                        raise self._give_up_error(deadline)(f'{self.name}: {e}') from e
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                recorded = True
+                return data
+        finally:
+            if trial and not recorded:
+                self.breaker.record_failure()
+
+    async def get_json_async(self, path, params=None):
+        deadline = _current_deadline.get()
+        trial = self._check_circuit()
+        recorded = False
+        attempt = 0
+        try:
+            while True:
+                try:
+                    timeout = self._attempt_timeout(deadline)
+                    with self._attempt():
+                        data = await aio.get_json(self.base_url + path, params=params, timeout=timeout)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not _is_retryable(e):
+                        if _is_client_error(e):
+                            self.breaker.record_success()
+                            recorded = True
+                        raise UpstreamError(f'{self.name}: {e}') from e
+                    self.breaker.record_failure()
+                    recorded = True
+                    delay = None if trial else self._backoff_delay(attempt, deadline)
+                    if delay is None:
+                        raise self._give_up_error(deadline)(f'{self.name}: {e!r}') from e
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                recorded = True
+                return data
+        finally:
+            if trial and not recorded:
+                self.breaker.record_failure()
+
+
+def _client(name, base_url, timeout):
+    return UpstreamClient(
+        name,
+        base_url,
+        timeout=timeout,
+        retries=settings.UPSTREAM_RETRIES,
+        backoff=settings.UPSTREAM_BACKOFF,
+        breaker=CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT),
+        pool_size=settings.UPSTREAM_POOL_SIZE,
+    )
+
+
+ipinfo = _client('ipinfo', settings.IPINFO_URL, settings.IPINFO_TIMEOUT)
+weatherapi = _client('weatherapi', settings.WEATHERAPI_URL, settings.WEATHERAPI_TIMEOUT)
+
+
+@metrics.register_collector
+def _collect_circuits():
+    for client in (ipinfo, weatherapi):
+        yield ('upstream_circuit_open', 'gauge', '1 while the upstream circuit breaker is open.',
+               {'upstream': client.name}, int(client.breaker.state == CircuitBreaker.OPEN))
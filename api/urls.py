@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path
 from .import views
 
 urlpatterns = [
-    path('', views.hello, name='hello'),
-]
\ No newline at end of file
+    path('hello', views.hello_async if settings.HELLO_ASYNC else views.hello, name='hello'),
+    path('hello/batch', views.hello_batch, name='hello-batch'),
+]
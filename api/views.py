@@ -1,12 +1,29 @@
+import asyncio
+import logging
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.shortcuts import render
+from django.http import JsonResponse, HttpResponseNotAllowed
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from .serializers import HelloSerializer
-import requests
+from django.core.cache import caches
+from .serializers import HelloSerializer, HelloBatchItemSerializer
+from .cache import TTLCache, SharedCache, StaleWhileRevalidateCache, AsyncSingleFlight, MISSING
+from hng1 import metrics
+from . import geoip, prefetch, upstream
 import urllib.parse
-from ipinfo import getHandler
+
+logger = logging.getLogger(__name__)
+# High-volume per-request line; sampled via settings.LOGGING
+client_ip_logger = logging.getLogger('api.client_ip')
+
+# Cache of IP address -> city, shared by all requests in this process
+city_cache = TTLCache(maxsize=settings.IPINFO_CACHE_SIZE, ttl=settings.IPINFO_CACHE_TTL)
 
 def sanitize_input(input_string):
     """Sanitize and clean user input."""
@@ -15,35 +32,165 @@ def sanitize_input(input_string):
         input_string = input_string[1:-1]
     return input_string
 
+def ipinfo_params():
+    return {'token': settings.IPINFO_API_KEY} if settings.IPINFO_API_KEY else None
+
+def fetch_city(ip):
+    """Fetch the city for ``ip`` from the ipinfo REST API."""
+    data = upstream.ipinfo.get_json(f"/{ip}/json", params=ipinfo_params())
+    return data['city']
+
 def get_city_from_ip(ip):
-    """Retrieve city name based on the IP address using ipinfo."""
-    handler = getHandler(settings.IPINFO_API_KEY)
+    """Retrieve city name based on the IP address using ipinfo.
+
+    Results are cached per IP; failed lookups are cached for a shorter
+    period so a flapping upstream is retried soon without being hammered.
+    While the ipinfo circuit is open, or when the request's upstream deadline
+    runs out, the fallback is returned uncached: neither says anything about
+    the IP.
+    With ``GEOIP_BACKEND = 'local'`` the offline index is used instead.
+    """
+    if settings.GEOIP_BACKEND == 'local':
+        return geoip.lookup(ip) or 'Unknown'
+    city = city_cache.get(ip)
+    if city is not MISSING:
+        return city
     try:
-        details = handler.getDetails(ip)
-        return details.city
-    except Exception as e:
-        print(f"Error retrieving city from IP: {e}")
+        city = fetch_city(ip)
+    except (upstream.CircuitOpenError, upstream.DeadlineExceeded):
+        return 'Unknown'
+    except (upstream.UpstreamError, KeyError, ValueError) as e:
+        logger.warning("Error retrieving city from IP: %s", e, extra={'ip': ip})
+        city_cache.set(ip, 'Unknown', ttl=settings.IPINFO_NEGATIVE_CACHE_TTL)
         return 'Unknown'
+    city_cache.set(ip, city)
+    return city
+
+def weatherapi_params(city):
+    return {'key': settings.WEATHERAPI_KEY or '', 'q': city, 'aqi': 'no'}
+
+def fetch_temperature(city):
+    """Fetch the current temperature for ``city`` from WeatherAPI.
+
+    Raises on any upstream or parsing error so failures are never cached.
+    """
+    data = upstream.weatherapi.get_json("/current.json", params=weatherapi_params(city))
+    return data['current']['temp_c']
+
+# Cache of city -> temperature. WeatherAPI refreshes current conditions every
+# 10-15 minutes, so caching for that long loses nothing.
+# With WEATHER_SHARED_CACHE the entries and hot-city list live in that cache,
+# so the prefetch_weather command can keep every worker's cities warm.
+if settings.WEATHER_SHARED_CACHE:
+    weather_cache = StaleWhileRevalidateCache(
+        fetch_temperature,
+        ttl=settings.WEATHER_CACHE_TTL,
+        stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+        timer=time.time,
+        store=SharedCache(
+            caches[settings.WEATHER_SHARED_CACHE], 'api.weather',
+            ttl=settings.WEATHER_CACHE_TTL + settings.WEATHER_CACHE_STALE_TTL,
+        ),
+    )
+    shared_hot_cities = prefetch.PublishedHotKeys(
+        caches[settings.WEATHER_SHARED_CACHE],
+        k=settings.WEATHER_PREFETCH_TOP_K,
+        interval=settings.WEATHER_PREFETCH_INTERVAL,
+    )
+else:
+    weather_cache = StaleWhileRevalidateCache(
+        fetch_temperature,
+        maxsize=settings.WEATHER_CACHE_SIZE,
+        ttl=settings.WEATHER_CACHE_TTL,
+        stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+    )
+    shared_hot_cities = None
+metrics.register_cache('ipinfo_city', city_cache)
+metrics.register_cache('weather', weather_cache)
+
+# Request frequency per city, used to keep the hottest cities' weather warm
+hot_cities = prefetch.HotKeys(k=settings.WEATHER_PREFETCH_TOP_K)
+weather_prefetcher = prefetch.WeatherPrefetcher(
+    weather_cache,
+    hot_cities,
+    interval=settings.WEATHER_PREFETCH_INTERVAL,
+    refresh_ahead=settings.WEATHER_PREFETCH_AHEAD,
+    max_calls=settings.WEATHER_PREFETCH_MAX_CALLS,
+    min_call_interval=settings.WEATHER_PREFETCH_MIN_CALL_INTERVAL,
+)
+
+def record_city(city):
+    """Count a request for ``city`` and make sure the prefetcher is running."""
+    if city == 'Unknown':
+        return
+    hot_cities.record(city)
+    if shared_hot_cities is not None:
+        shared_hot_cities.publish(hot_cities)
+    if settings.WEATHER_PREFETCH_ENABLED:
+        weather_prefetcher.ensure_started()
 
 def get_weather_and_location(city):
     """Retrieve weather information based on the city using WeatherAPI."""
-    api_key = settings.WEATHERAPI_KEY
+    record_city(city)
     try:
-        response = requests.get(f"http://api.weatherapi.com/v1/current.json?key={api_key}&q={city}&aqi=no")
-        response.raise_for_status()
-        data = response.json()
-        temperature = data['current']['temp_c']
+        temperature = weather_cache.get(city)
         return city, temperature
-    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
-        print(f"Error retrieving weather and location data: {e}")
+    except upstream.CircuitOpenError:
+        return 'Unknown', None
+    except (upstream.UpstreamError, KeyError, ValueError) as e:
+        logger.warning("Error retrieving weather and location data: %s", e, extra={'city': city})
         return 'Unknown', None
 
-@api_view(['GET'])
-def hello(request):
-    visitor_name = request.GET.get('visitor_name', 'Guest')
-    visitor_name = sanitize_input(visitor_name)
-    
-    # Determine client IP
+# Coalesces concurrent async lookups for the same IP / city
+city_flight = AsyncSingleFlight()
+weather_flight = AsyncSingleFlight()
+
+async def fetch_city_async(ip):
+    """Fetch the city for ``ip`` from the ipinfo REST API."""
+    data = await upstream.ipinfo.get_json_async(f"/{ip}/json", params=ipinfo_params())
+    return data['city']
+
+async def get_city_from_ip_async(ip):
+    """Async variant of ``get_city_from_ip`` sharing the same cache."""
+    if settings.GEOIP_BACKEND == 'local':
+        return geoip.lookup(ip) or 'Unknown'
+    city = city_cache.get(ip)
+    if city is not MISSING:
+        return city
+    try:
+        city = await city_flight.do(ip, lambda: fetch_city_async(ip))
+    except (upstream.CircuitOpenError, upstream.DeadlineExceeded):
+        return 'Unknown'
+    except (upstream.UpstreamError, KeyError, ValueError) as e:
+        logger.warning("Error retrieving city from IP: %s", e, extra={'ip': ip})
+        city_cache.set(ip, 'Unknown', ttl=settings.IPINFO_NEGATIVE_CACHE_TTL)
+        return 'Unknown'
+    city_cache.set(ip, city)
+    return city
+
+async def fetch_temperature_async(city):
+    """Fetch the current temperature for ``city`` from WeatherAPI."""
+    data = await upstream.weatherapi.get_json_async("/current.json", params=weatherapi_params(city))
+    return data['current']['temp_c']
+
+async def get_weather_and_location_async(city):
+    """Async variant of ``get_weather_and_location`` sharing the same cache."""
+    record_city(city)
+    temperature = weather_cache.get_cached(city)
+    if temperature is not MISSING:
+        return city, temperature
+    try:
+        temperature = await weather_flight.do(city, lambda: fetch_temperature_async(city))
+    except upstream.CircuitOpenError:
+        return 'Unknown', None
+    except (upstream.UpstreamError, KeyError, ValueError) as e:
+        logger.warning("Error retrieving weather and location data: %s", e, extra={'city': city})
+        return 'Unknown', None
+    weather_cache.set(city, temperature)
+    return city, temperature
+
+def get_client_ip(request):
+    """Determine the client IP, substituting a public IP for local testing."""
     client_ip = request.META.get('HTTP_X_REAL_IP', request.META.get('REMOTE_ADDR'))
     if isinstance(client_ip, list):
         client_ip = client_ip[0].strip()
@@ -53,14 +200,16 @@ def hello(request):
         client_ip = '8.8.8.8'  # Fallback to a default IP if not found
 
     # Log the client IP for debugging
-    print(f"Client IP: {client_ip}")
+    if client_ip_logger.isEnabledFor(logging.INFO):
+        client_ip_logger.info("Client IP: %s", client_ip, extra={'client_ip': client_ip})
     
     # Handle local testing scenario
     if client_ip == '127.0.0.1':
         client_ip = '102.91.93.2'  # Use an external IP for testing
+    return client_ip
 
-    city = get_city_from_ip(client_ip)
-    city, temperature = get_weather_and_location(city)
+def build_greeting(visitor_name, client_ip, city, temperature):
+    """Build the serialized ``hello`` payload."""
     if temperature is None:
         temperature = "unknown"
     
@@ -75,5 +224,114 @@ def hello(request):
     # Serialize data using the HelloSerializer
     serializer = HelloSerializer(data=data)
     serializer.is_valid()
+    return serializer.data
+
+@api_view(['GET'])
+def hello(request):
+    visitor_name = request.GET.get('visitor_name', 'Guest')
+    visitor_name = sanitize_input(visitor_name)
+    client_ip = get_client_ip(request)
+
+    # Both lookups share one time budget so a slow upstream cannot hold the worker
+    with upstream.deadline_scope(settings.UPSTREAM_DEADLINE):
+        city = get_city_from_ip(client_ip)
+        city, temperature = get_weather_and_location(city)
+
+    data = build_greeting(visitor_name, client_ip, city, temperature)
+    return Response(data, status=status.HTTP_200_OK)
+
+# Shared pool for the concurrent lookups made by hello_batch
+batch_executor = ThreadPoolExecutor(max_workers=settings.HELLO_BATCH_WORKERS, thread_name_prefix='hello-batch')
+
+def map_unique(fn, keys):
+    """Call ``fn`` once per distinct key, concurrently; return ``{key: result}``.
+
+    Each call runs in a copy of the caller's context so the request's
+    upstream deadline applies to it.
+    """
+    unique = list(dict.fromkeys(keys))
+    futures = [batch_executor.submit(contextvars.copy_context().run, fn, key) for key in unique]
+    return {key: future.result() for key, future in zip(unique, futures)}
+
+@api_view(['POST'])
+def hello_batch(request):
+    """Greet a list of ``{visitor_name, ip}`` items in one call.
+
+    IPs are deduplicated and resolved concurrently, then the resulting
+    cities are deduplicated before weather is fetched, so each distinct IP
+    and city costs at most one upstream lookup.
+    """
+    # Bound the work before validating every item
+    if isinstance(request.data, list) and len(request.data) > settings.HELLO_BATCH_MAX_ITEMS:
+        return Response({
+            'errors': [{'field': 'non_field_errors',
+                        'message': f'At most {settings.HELLO_BATCH_MAX_ITEMS} items are allowed.'}]
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    serializer = HelloBatchItemSerializer(data=request.data, many=True)
+    if not serializer.is_valid():
+        item_errors = serializer.errors
+        if isinstance(item_errors, dict):
+            # The payload itself was not a list
+            item_errors = [item_errors]
+        errors = []
+        for index, field_errors in enumerate(item_errors):
+            for field, messages in field_errors.items():
+                for message in messages:
+                    errors.append({'field': f'{index}.{field}', 'message': message})
+        return Response({
+            'errors': errors
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    items = serializer.validated_data
+    with upstream.deadline_scope(settings.UPSTREAM_DEADLINE):
+        cities = map_unique(get_city_from_ip, [item['ip'] for item in items])
+        weather = map_unique(get_weather_and_location, cities.values())
+
+    data = []
+    for item in items:
+        city, temperature = weather[cities[item['ip']]]
+        data.append(build_greeting(sanitize_input(item['visitor_name']), item['ip'], city, temperature))
+    return Response(data, status=status.HTTP_200_OK)
+
+def check_access(request):
+    """Apply DRF's default authentication and permissions to a plain Django request.
+
+    Returns the rendered error response if the request is refused, else None.
+    """
+    view = APIView()
+    view.args, view.kwargs = (), {}
+    view.headers = view.default_response_headers
+    drf_request = view.request = view.initialize_request(request)
+    try:
+        view.initial(drf_request)
+    except Exception as exc:
+        return view.finalize_response(drf_request, view.handle_exception(exc)).render()
+    request.user = drf_request.user
+    return None
+
+async def hello_async(request):
+    """Native async ``hello`` for ASGI deployments.
+
+    Upstream calls share a keep-alive aiohttp session with strict timeouts,
+    so a slow upstream parks a coroutine instead of a worker thread. Requests
+    are authenticated like the sync ``hello`` view.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    denied = await sync_to_async(check_access)(request)
+    if denied is not None:
+        return denied
+
+    client_ip = get_client_ip(request)
+    with upstream.deadline_scope(settings.UPSTREAM_DEADLINE):
+        # Start the geo lookup straight away; the weather fetch follows as
+        # soon as the city is known.
+        city_task = asyncio.ensure_future(get_city_from_ip_async(client_ip))
+        visitor_name = sanitize_input(request.GET.get('visitor_name', 'Guest'))
+
+        city = await city_task
+        city, temperature = await get_weather_and_location_async(city)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    data = build_greeting(visitor_name, client_ip, city, temperature)
+    return JsonResponse(data, status=status.HTTP_200_OK)
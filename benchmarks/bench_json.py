@@ -0,0 +1,87 @@
+"""Compare FastJSONRenderer with DRF's JSONRenderer on real response payloads.
+
+    python -m benchmarks.bench_json [--orgs 10000] [--repeat 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hng1.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from hng1.renderers import FastJSONRenderer  # noqa: E402
+from user_management.models import Organization, User  # noqa: E402
+from user_management.serializers import OrganizationSerializer  # noqa: E402
+
+
+def payloads(org_count):
+    """Build payloads shaped exactly like the app's responses."""
+    user = User(userId=uuid.uuid4(), firstName='Ada', lastName='Obi', email='ada@example.com', phone='0810')
+    orgs = [
+        Organization(orgId=uuid.uuid4(), name=f"User {i}'s Organisation", description='An organisation')
+        for i in range(org_count)
+    ]
+    return {
+        'hello': {
+            'client_ip': '102.91.93.2',
+            'location': 'Lagos',
+            'greeting': 'Hello, Mark! The temperature is 30.5 degrees Celsius in Lagos.',
+        },
+        'login': {
+            'status': 'success',
+            'message': 'Login successful',
+            'data': {
+                'accessToken': 'x' * 230,
+                'user': {
+                    'userId': user.userId,
+                    'firstName': user.firstName,
+                    'lastName': user.lastName,
+                    'email': user.email,
+                    'phone': user.phone,
+                },
+            },
+        },
+        f'organisations[{org_count}]': OrganizationSerializer(orgs, many=True).data,
+    }
+
+
+def bench(renderer, payload, repeat):
+    number = max(1, 20000 // max(1, len(JSONRenderer().render(payload)) // 100))
+    best = min(timeit.repeat(lambda: renderer.render(payload), number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orgs', type=int, default=10000, help='organisations in the listing payload')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, payload in payloads(args.orgs).items():
+        assert FastJSONRenderer().render(payload) == JSONRenderer().render(payload)
+        stock = bench(JSONRenderer(), payload, args.repeat)
+        fast = bench(FastJSONRenderer(), payload, args.repeat)
+        results.append({'payload': name, 'stock_us': stock, 'fast_us': fast, 'speedup': stock / fast})
+
+    print(f"{'payload':<22}{'JSONRenderer':>14}{'FastJSON':>12}{'speedup':>9}")
+    for r in results:
+        print(f"{r['payload']:<22}{r['stock_us']:>12.1f}us{r['fast_us']:>10.1f}us{r['speedup']:>8.1f}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Password verification throughput (logins per second, per core) by hashing pool.
+
+    python -m benchmarks.bench_login [--iterations 600000] [--logins 64] [--concurrency 8] [--json out.json]
+
+Each login is one ``User.check_password`` call, the CPU-bound part of
+``/auth/login/``; no database is used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hng1.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import override_settings  # noqa: E402
+
+from user_management import hashing  # noqa: E402
+from user_management.models import User  # noqa: E402
+
+
+def run(pool, workers, iterations, logins, concurrency):
+    with override_settings(PASSWORD_HASHING_POOL=pool, PASSWORD_HASHING_WORKERS=workers,
+                           PASSWORD_PBKDF2_ITERATIONS=iterations):
+        user = User(email='bench@example.com')
+        user.set_password('correct horse battery staple')
+        user.check_password('correct horse battery staple')  # warm up the pool
+
+        # ``concurrency`` request threads logging in at once
+        with ThreadPoolExecutor(concurrency) as requests:
+            started = time.perf_counter()
+            results = list(requests.map(lambda _: user.check_password('correct horse battery staple'),
+                                        range(logins)))
+            elapsed = time.perf_counter() - started
+        hashing.shutdown()
+
+    assert all(results)
+    cores = 1 if pool == 'inline' else min(workers, os.cpu_count() or 1)
+    rate = logins / elapsed
+    return {'pool': pool, 'workers': workers, 'logins_per_s': round(rate, 2),
+            'cores': cores, 'logins_per_s_per_core': round(rate / cores, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=600000, help='PBKDF2 iterations')
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing pool size')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    results = [run(pool, args.workers, args.iterations, args.logins, args.concurrency)
+               for pool in ('inline', 'thread', 'process')]
+
+    print(f"{'pool':<9}{'workers':>8}{'logins/s':>11}{'per core':>10}")
+    for r in results:
+        print(f"{r['pool']:<9}{r['workers']:>8}{r['logins_per_s']:>11}{r['logins_per_s_per_core']:>10}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'iterations': args.iterations, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
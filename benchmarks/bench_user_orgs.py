@@ -0,0 +1,109 @@
+"""Latency of ``GET /api/users/<pk>/organisations/`` as the membership table grows.
+
+    python -m benchmarks.bench_user_orgs [--sizes 1000 10000 100000] [--requests 200] [--json out.json]
+
+For each size the membership table is filled with that many rows spread
+over other users, while the measured user always belongs to the same 50
+organisations. With the (user, organization) index the latency should not
+depend on the table size; ``--drop-index`` shows the difference without it.
+Runs against a throwaway SQLite database.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hng1.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['DB_ENGINE'] = 'django.db.backends.sqlite3'
+os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from user_management.models import Organization, User  # noqa: E402
+
+OWN_ORGANISATIONS = 50
+USERS_PER_ORG = 100
+BATCH = 5000
+
+Membership = Organization.users.through
+
+
+def grow_to(size):
+    """Add memberships for other users until the table holds ``size`` rows."""
+    while Membership.objects.count() < size:
+        missing = size - Membership.objects.count()
+        orgs = [Organization(orgId=uuid.uuid4(), name='Other') for _ in range(-(-missing // USERS_PER_ORG))]
+        Organization.objects.bulk_create(orgs, batch_size=BATCH)
+        users = [User(userId=uuid.uuid4(), email=f'{uuid.uuid4().hex}@example.com', firstName='U', lastName='L')
+                 for _ in range(min(missing, USERS_PER_ORG))]
+        User.objects.bulk_create(users, batch_size=BATCH)
+        rows = [Membership(organization_id=org.orgId, user_id=user.userId) for org in orgs for user in users]
+        Membership.objects.bulk_create(rows[:missing], batch_size=BATCH)
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def measure(client, url, requests):
+    client.get(url)  # warm up
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200 and len(response.data['results']) == OWN_ORGANISATIONS
+    timings.sort()
+    return {'p50_ms': round(percentile(timings, 0.5), 3), 'p99_ms': round(percentile(timings, 0.99), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='membership table sizes to measure')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--drop-index', action='store_true', help='measure without the (user, organization) index')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    setup_test_environment()  # lets the test client's host through ALLOWED_HOSTS
+    call_command('migrate', verbosity=0)
+    if args.drop_index:
+        call_command('migrate', 'user_management', '0002', verbosity=0)
+
+    user = User.objects.create_user(email='bench@example.com', firstName='B', lastName='U', password=None)
+    for _ in range(OWN_ORGANISATIONS):
+        Organization.objects.create(name='Own').users.add(user)
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f'/api/users/{user.pk}/organisations/?page_size={OWN_ORGANISATIONS}'
+
+    results = []
+    for size in sorted(args.sizes):
+        grow_to(size)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        results.append({'memberships': size, **measure(client, url, args.requests)})
+
+    print(f'{"memberships":>12} {"p50 ms":>8} {"p99 ms":>8}')
+    for result in results:
+        print(f'{result["memberships"]:>12} {result["p50_ms"]:>8} {result["p99_ms"]:>8}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
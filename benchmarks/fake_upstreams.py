@@ -0,0 +1,77 @@
+"""Local stand-ins for ipinfo and WeatherAPI with configurable latency and errors.
+
+    python -m benchmarks.fake_upstreams --port 9100 --latency-ms 50 --error-rate 0.01
+
+Point the app at it with
+    IPINFO_URL=http://127.0.0.1:9100/ipinfo WEATHERAPI_URL=http://127.0.0.1:9100/weather/v1
+"""
+import argparse
+import asyncio
+import random
+import zlib
+
+from aiohttp import web
+
+CITIES = ['Lagos', 'Abuja', 'Kano', 'Ibadan', 'Accra', 'Nairobi', 'London', 'Berlin', 'Paris', 'Madrid']
+
+
+def city_for_ip(ip):
+    return CITIES[zlib.crc32(ip.encode()) % len(CITIES)]
+
+
+def make_app(latency_ms=50.0, jitter_ms=10.0, error_rate=0.0):
+    """Return an aiohttp app serving both fake upstreams.
+
+    Each response is delayed by ``latency_ms`` +/- ``jitter_ms`` and fails
+    with a 503 with probability ``error_rate``. Call counts are kept in
+    ``app['calls']``.
+    """
+    app = web.Application()
+    app['calls'] = {'ipinfo': 0, 'weather': 0}
+
+    async def upstream_delay():
+        delay = max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if random.random() < error_rate:
+            raise web.HTTPServiceUnavailable()
+
+    async def ipinfo(request):
+        app['calls']['ipinfo'] += 1
+        await upstream_delay()
+        ip = request.match_info['ip']
+        return web.json_response({'ip': ip, 'city': city_for_ip(ip), 'country': 'NG'})
+
+    async def weather(request):
+        app['calls']['weather'] += 1
+        await upstream_delay()
+        city = request.query.get('q', '')
+        if city not in CITIES:
+            return web.json_response({'error': {'code': 1006, 'message': 'No matching location found.'}}, status=400)
+        return web.json_response({
+            'location': {'name': city},
+            'current': {'temp_c': 20 + CITIES.index(city) * 0.5},
+        })
+
+    async def calls(request):
+        return web.json_response(app['calls'])
+
+    app.router.add_get('/ipinfo/{ip}/json', ipinfo)
+    app.router.add_get('/weather/v1/current.json', weather)
+    app.router.add_get('/calls', calls)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+    app = make_app(args.latency_ms, args.jitter_ms, args.error_rate)
+    web.run_app(app, host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
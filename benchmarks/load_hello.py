@@ -0,0 +1,224 @@
+"""Offline load test for GET /api/hello.
+
+Starts the fake upstreams and the app on local ports, drives /api/hello at a
+fixed concurrency and reports throughput and latency percentiles for every
+combination of serving mode (sync WSGI runserver / async uvicorn) and cache
+(on / off):
+
+    python -m benchmarks.load_hello --requests 2000 --concurrency 50 --output results.json
+
+The async mode needs uvicorn (see benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CACHE_OFF = {
+    'IPINFO_CACHE_TTL': '0',
+    'IPINFO_NEGATIVE_CACHE_TTL': '0',
+    'WEATHER_CACHE_TTL': '0',
+    'WEATHER_CACHE_STALE_TTL': '0',
+}
+
+CREATE_USER = (
+    "from user_management.models import User;"
+    "from rest_framework_simplejwt.tokens import AccessToken;"
+    "u = User.objects.create_user(email='bench@example.com', firstName='Bench', lastName='User', password='x');"
+    "print(AccessToken.for_user(u))"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing listening on port {port} after {timeout}s')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def manage(env, *args):
+    return subprocess.run([sys.executable, 'manage.py', *args], cwd=ROOT, env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def server_command(mode, port):
+    if mode == 'sync':
+        return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    return [sys.executable, '-m', 'uvicorn', 'hng1.asgi:application', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log']
+
+
+async def upstream_calls(upstream_port):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{upstream_port}/calls') as response:
+            return await response.json()
+
+
+async def drive(url, token, total, concurrency, ips):
+    """Send ``total`` requests with ``concurrency`` in flight; return (latencies, errors, seconds)."""
+    latencies = []
+    errors = 0
+    remaining = total
+    headers = {'Authorization': f'Bearer {token}'}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    async with session.get(url, params={'visitor_name': 'Bench'},
+                                           headers={'X-Real-IP': random.choice(ips)}) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return latencies, errors, time.perf_counter() - started
+
+
+def run_scenario(mode, cache, args, env, token, upstream_port, ips):
+    port = free_port()
+    scenario_env = dict(env)
+    if mode == 'async':
+        scenario_env['HELLO_ASYNC'] = 'true'
+    if cache == 'off':
+        scenario_env.update(CACHE_OFF)
+
+    server = subprocess.Popen(server_command(mode, port), cwd=ROOT, env=scenario_env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        url = f'http://127.0.0.1:{port}/api/hello'
+        asyncio.run(drive(url, token, min(args.concurrency, args.requests), args.concurrency, ips))  # warm-up
+        before = asyncio.run(upstream_calls(upstream_port))
+        latencies, errors, elapsed = asyncio.run(drive(url, token, args.requests, args.concurrency, ips))
+        after = asyncio.run(upstream_calls(upstream_port))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    latencies.sort()
+    return {
+        'server': mode,
+        'cache': cache,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'upstream_calls': {name: after[name] - before[name] for name in after},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['sync', 'async', 'both'], default='both')
+    parser.add_argument('--cache', choices=['on', 'off', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--distinct-ips', type=int, default=200, help='size of the client IP pool')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='fake upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fake upstream 503 probability')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    modes = ['sync', 'async'] if args.server == 'both' else [args.server]
+    if 'async' in modes and importlib.util.find_spec('uvicorn') is None:
+        parser.error('async mode needs uvicorn: pip install -r benchmarks/requirements.txt')
+    caches = ['on', 'off'] if args.cache == 'both' else [args.cache]
+    ips = [f'102.{i // 250 % 250}.{i % 250}.{random.randint(1, 254)}' for i in range(args.distinct_ips)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream_port = free_port()
+        upstream_url = f'http://127.0.0.1:{upstream_port}'
+        env = dict(
+            os.environ,
+            SECRET_KEY='benchmark',
+            DB_ENGINE='django.db.backends.sqlite3',
+            DB_NAME=os.path.join(tmp, 'bench.sqlite3'),
+            IPINFO_URL=f'{upstream_url}/ipinfo',
+            WEATHERAPI_URL=f'{upstream_url}/weather/v1',
+            LOG_LEVEL='WARNING',
+            PYTHONPATH=ROOT,
+        )
+        manage(env, 'migrate', '--verbosity', '0')
+        token = manage(env, 'shell', '-c', CREATE_USER).strip()
+
+        upstreams = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.fake_upstreams', '--port', str(upstream_port),
+             '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+             '--error-rate', str(args.error_rate)],
+            cwd=ROOT, env=env,
+        )
+        try:
+            wait_for_port(upstream_port)
+            results = []
+            for mode in modes:
+                for cache in caches:
+                    result = run_scenario(mode, cache, args, env, token, upstream_port, ips)
+                    print(f"{mode:>5} cache={cache:<3} {result['throughput_rps']:>8} req/s  "
+                          f"p50={result['latency_ms']['p50']}ms p99={result['latency_ms']['p99']}ms "
+                          f"errors={result['errors']}", file=sys.stderr)
+                    results.append(result)
+        finally:
+            upstreams.terminate()
+            upstreams.wait(timeout=10)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
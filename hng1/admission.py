@@ -0,0 +1,236 @@
+"""Admission control: adaptive per-route concurrency limits with load shedding.
+
+Each configured path prefix gets an ``AdaptiveLimiter``. A request runs if
+fewer than ``limit`` requests of its route are in flight. Otherwise it waits
+in a bounded FIFO queue for up to ``timeout`` seconds. If the queue is full
+or the wait runs out, the request is turned away at once with 503 and
+``Retry-After``, so a burst on one route (PBKDF2-heavy logins) cannot tie up
+every worker thread.
+
+Limits adapt to latency, AIMD style. A request that finishes within
+``target_latency`` raises the limit by ``1 / limit``, which is about +1 per
+limit's worth of requests. A slower one multiplies the limit by
+``decrease_factor``, at most once per ``target_latency`` seconds.
+"""
+import asyncio
+import collections
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+
+REJECTED = metrics.Counter('admission_rejected_total', 'Requests shed by admission control.', ('route', 'reason'))
+
+
+class _Waiter:
+    __slots__ = ('granted', 'event', 'loop', 'future')
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.granted = False
+        self.event = event
+        self.loop = loop
+        self.future = future
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded wait queue, usable from threads and asyncio."""
+
+    def __init__(self, limit, min_limit=1, max_limit=None, queue_size=0, timeout=1.0,
+                 target_latency=0.5, decrease_factor=0.9, timer=time.monotonic):
+        self.limit = float(limit)
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max_limit or limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+        self._last_decrease = float('-inf')
+        self.in_flight = 0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def _try_acquire(self):
+        """Take a slot if one is free and nobody is queued; caller holds the lock."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _grant_waiters(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def acquire(self):
+        """Return ``'ok'`` once a slot is held, or ``'queue_full'``/``'timeout'``."""
+        with self._lock:
+            if self._try_acquire():
+                return 'ok'
+            if len(self._waiters) >= self.queue_size:
+                return 'queue_full'
+            waiter = _Waiter(event=threading.Event())
+            self._waiters.append(waiter)
+        waiter.event.wait(self.timeout)
+        with self._lock:
+            if waiter.granted:
+                return 'ok'
+            self._waiters.remove(waiter)
+            return 'timeout'
+
+    async def acquire_async(self):
+        """Awaitable ``acquire``."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return 'ok'
+            if len(self._waiters) >= self.queue_size:
+                return 'queue_full'
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._grant_waiters()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+        with self._lock:
+            if waiter.granted:
+                return 'ok'
+            self._waiters.remove(waiter)
+            return 'timeout'
+
+    def release(self, latency):
+        """Give back a slot, adapting the limit to the request's ``latency`` in seconds."""
+        with self._lock:
+            self.in_flight -= 1
+            if latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                now = self._timer()
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._grant_waiters()
+
+    def retry_after(self):
+        """Seconds a shed client should wait: about one queue's worth of service time."""
+        return max(1, math.ceil(self.target_latency * (self.queue_size + 1) / max(1, int(self.limit))))
+
+
+def build_limiters(config):
+    """Return ``[(path prefix, limiter)]`` for ``ADMISSION_LIMITS``, longest prefix first."""
+    limiters = []
+    for prefix, options in config.items():
+        limiters.append((prefix, AdaptiveLimiter(
+            limit=options['limit'],
+            min_limit=options.get('min_limit', 1),
+            max_limit=options.get('max_limit'),
+            queue_size=options.get('queue', 0),
+            timeout=options.get('timeout', 1.0),
+            target_latency=options.get('target_latency', 0.5),
+            decrease_factor=options.get('decrease_factor', 0.9),
+        )))
+    limiters.sort(key=lambda item: len(item[0]), reverse=True)
+    return limiters
+
+
+class AdmissionControlMiddleware:
+    """Apply the ``ADMISSION_LIMITS`` limiter matching the request path, if any."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiters = build_limiters(settings.ADMISSION_LIMITS) if settings.ADMISSION_CONTROL else []
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        global _active
+        _active = self.limiters
+
+    def _limiter_for(self, path):
+        for prefix, limiter in self.limiters:
+            if path.startswith(prefix):
+                return prefix, limiter
+        return None, None
+
+    def _reject(self, prefix, limiter, reason):
+        REJECTED.inc(prefix, reason)
+        response = JsonResponse({
+            'status': 'Service unavailable',
+            'message': 'Server is busy, please retry later',
+            'statusCode': 503,
+        }, status=503)
+        response['Retry-After'] = str(limiter.retry_after())
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        prefix, limiter = self._limiter_for(request.path)
+        if limiter is None:
+            return self.get_response(request)
+        outcome = limiter.acquire()
+        if outcome != 'ok':
+            return self._reject(prefix, limiter, outcome)
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    async def __acall__(self, request):
+        prefix, limiter = self._limiter_for(request.path)
+        if limiter is None:
+            return await self.get_response(request)
+        outcome = await limiter.acquire_async()
+        if outcome != 'ok':
+            return self._reject(prefix, limiter, outcome)
+        started = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+
+# Limiters of the most recently loaded middleware; one per process in practice
+_active = []
+
+
+@metrics.register_collector
+def _collect():
+    for prefix, limiter in _active:
+        labels = {'route': prefix}
+        yield 'admission_limit', 'gauge', 'Current adaptive concurrency limit.', labels, int(limiter.limit)
+        yield 'admission_in_flight', 'gauge', 'Requests currently admitted.', labels, limiter.in_flight
+        yield 'admission_queued', 'gauge', 'Requests waiting for admission.', labels, limiter.queued
@@ -3,6 +3,9 @@ ASGI config for hng1 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Set HELLO_ASYNC=true to serve /api/hello with the native async view, e.g.
+``HELLO_ASYNC=true uvicorn hng1.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -0,0 +1,16 @@
+from django.db.backends.mysql import base
+
+from hng1.db.pool import PooledDatabaseCreationMixin, PooledDatabaseWrapperMixin
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin, base.DatabaseCreation):
+    pass
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """``django.db.backends.mysql`` with pooled connections (see ``hng1.db.pool``)."""
+
+    creation_class = DatabaseCreation
+
+    def check_pooled_connection(self, connection):
+        connection.ping()
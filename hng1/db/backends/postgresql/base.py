@@ -0,0 +1,23 @@
+from django.db.backends.postgresql import base
+
+from hng1.db.pool import PooledDatabaseCreationMixin, PooledDatabaseWrapperMixin
+
+
+class DatabaseCreation(PooledDatabaseCreationMixin, base.DatabaseCreation):
+    pass
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """``django.db.backends.postgresql`` with pooled connections (see ``hng1.db.pool``)."""
+
+    creation_class = DatabaseCreation
+
+    def check_pooled_connection(self, connection):
+        if connection.closed:
+            raise base.Database.InterfaceError('connection already closed')
+        super().check_pooled_connection(connection)
+
+    def reuse_connection_state(self, connection):
+        # Mirrors get_new_connection; the level itself is already set on the connection
+        level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = base.IsolationLevel.READ_COMMITTED if level is None else base.IsolationLevel(level)
@@ -0,0 +1,339 @@
+"""Process-wide pools of raw DB-API connections behind Django's per-thread wrappers.
+
+Django opens a connection on first use in a request and, with the default
+``CONN_MAX_AGE = 0``, closes it when the request ends.
+``PooledDatabaseWrapperMixin`` turns that open into a checkout from a
+``ConnectionPool`` and that close into a return, so requests skip the TCP
+connect, TLS setup and authentication. Connections are:
+
+* created on demand up to ``MAX_SIZE``; checkouts beyond that wait up to
+  ``TIMEOUT`` seconds, then raise ``PoolTimeout``
+* pinged before reuse if they sat idle for ``HEALTH_CHECK_INTERVAL``
+  seconds or more (0 pings on every checkout)
+* closed once older than ``MAX_LIFETIME``, or idle for longer than
+  ``MAX_IDLE`` while more than ``MIN_SIZE`` are open
+* discarded instead of returned if they were left in a transaction or had
+  a database error
+
+Options come from the ``POOL`` dict of the ``DATABASES`` entry. Keep
+``CONN_MAX_AGE`` at 0 so connections go back to the pool after every request.
+"""
+import collections
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from hng1 import metrics
+
+CHECKOUTS = metrics.Counter('db_pool_checkouts_total', 'Connections handed out by the pool.', ('alias',))
+CONNECTS = metrics.Counter('db_pool_connects_total', 'New connections opened by the pool.', ('alias',))
+TIMEOUTS = metrics.Counter('db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection.', ('alias',))
+DISCARDS = metrics.Counter('db_pool_discards_total', 'Pooled connections closed, by reason.', ('alias', 'reason'))
+WAIT_SECONDS = metrics.Histogram('db_pool_wait_seconds', 'Time to check out a connection.', ('alias',),
+                                 buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+
+class PoolTimeout(OperationalError):
+    """No pooled connection became free within the checkout timeout."""
+
+
+class _Entry:
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection, created_at):
+        self.connection = connection
+        self.created_at = created_at
+        self.returned_at = created_at
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of raw connections, shared by every thread of a process.
+
+    LIFO reuse keeps the busiest connections warm and lets the surplus sit
+    idle long enough to be reaped.
+    """
+
+    def __init__(self, alias='default', min_size=0, max_size=10, timeout=5.0, max_lifetime=1800.0,
+                 max_idle=300.0, health_check_interval=30.0, timer=time.monotonic):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError('pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1')
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._timer = timer
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._in_use = {}  # id(connection) -> _Entry
+        self.size = 0  # idle + in use, including connections being opened
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    def _expired(self, entry, now):
+        return self.max_lifetime is not None and now - entry.created_at >= self.max_lifetime
+
+    def _discard(self, entry, reason):
+        """Forget ``entry``; caller holds the lock and closes the connection afterwards."""
+        self.size -= 1
+        DISCARDS.inc(self.alias, reason)
+        self._cond.notify()
+
+    def acquire(self, connect, check):
+        """Return ``(connection, reused)``.
+
+        ``connect()`` opens a new connection; ``check(connection)`` raises
+        if a pooled one is no longer usable.
+        """
+        # Waiting uses the real clock; the injectable timer drives ages only
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            entry, stale = self._checkout(deadline)
+            for old in stale:
+                _close_quietly(old.connection)
+            if entry is None:
+                break
+            if self._timer() - entry.returned_at >= self.health_check_interval:
+                try:
+                    check(entry.connection)
+                except Exception:
+                    with self._cond:
+                        del self._in_use[id(entry.connection)]
+                        self._discard(entry, 'unhealthy')
+                    _close_quietly(entry.connection)
+                    continue
+            WAIT_SECONDS.observe(time.monotonic() - started, self.alias)
+            CHECKOUTS.inc(self.alias)
+            return entry.connection, True
+
+        # A slot was reserved for a new connection
+        try:
+            connection = connect()
+        except BaseException:
+            with self._cond:
+                self.size -= 1
+                self._cond.notify()
+            raise
+        entry = _Entry(connection, self._timer())
+        with self._cond:
+            self._in_use[id(connection)] = entry
+        CONNECTS.inc(self.alias)
+        WAIT_SECONDS.observe(time.monotonic() - started, self.alias)
+        CHECKOUTS.inc(self.alias)
+        return connection, False
+
+    def _checkout(self, deadline):
+        """Pop a live idle entry, or reserve a slot and return None; also return expired entries."""
+        stale = []
+        with self._cond:
+            while True:
+                now = self._timer()
+                while self._idle:
+                    entry = self._idle.pop()
+                    if self._expired(entry, now):
+                        self._discard(entry, 'lifetime')
+                        stale.append(entry)
+                        continue
+                    self._in_use[id(entry.connection)] = entry
+                    return entry, stale
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, stale
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    TIMEOUTS.inc(self.alias)
+                    for entry in stale:
+                        _close_quietly(entry.connection)
+                    raise PoolTimeout(
+                        f'no database connection available in pool {self.alias!r} within {self.timeout}s'
+                    )
+                self._cond.wait(remaining)
+
+    def release(self, connection, discard=False):
+        """Return ``connection`` to the pool, or close it if ``discard`` or past its lifetime."""
+        stale = []
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is None:
+                stale = None  # not from this pool, e.g. opened before the pools were reset
+            else:
+                now = self._timer()
+                if discard or self._expired(entry, now):
+                    self._discard(entry, 'error' if discard else 'lifetime')
+                    stale.append(entry)
+                else:
+                    entry.returned_at = now
+                    self._idle.append(entry)
+                    self._cond.notify()
+                # Reap connections idle for too long, oldest first, down to min_size
+                while (self._idle and self.size > self.min_size
+                       and now - self._idle[0].returned_at >= self.max_idle):
+                    old = self._idle.popleft()
+                    self._discard(old, 'idle')
+                    stale.append(old)
+        if stale is None:
+            _close_quietly(connection)
+            return
+        for old in stale:
+            _close_quietly(old.connection)
+
+    def fill(self, connect):
+        """Open connections until ``min_size`` are open."""
+        while True:
+            with self._cond:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            try:
+                connection = connect()
+            except BaseException:
+                with self._cond:
+                    self.size -= 1
+                raise
+            CONNECTS.inc(self.alias)
+            with self._cond:
+                self._idle.appendleft(_Entry(connection, self._timer()))
+                self._cond.notify()
+
+    def close(self):
+        """Close every idle connection; connections in use are closed when returned."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self.size -= len(idle)
+        for entry in idle:
+            _close_quietly(entry.connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(alias, settings_dict):
+    return (alias, settings_dict.get('NAME'), settings_dict.get('HOST'), settings_dict.get('PORT'),
+            settings_dict.get('USER'))
+
+
+def get_pool(alias, settings_dict):
+    """Return the process's pool for this alias and database, creating it if needed.
+
+    Returns ``(pool, created)``.
+    """
+    key = _pool_key(alias, settings_dict)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool, False
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool, False
+        options = settings_dict.get('POOL') or {}
+        pool = _pools[key] = ConnectionPool(
+            alias=alias,
+            min_size=options.get('MIN_SIZE', 0),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 5.0),
+            max_lifetime=options.get('MAX_LIFETIME', 1800.0),
+            max_idle=options.get('MAX_IDLE', 300.0),
+            health_check_interval=options.get('HEALTH_CHECK_INTERVAL', 30.0),
+        )
+        return pool, True
+
+
+def close_pools(alias=None):
+    """Close the idle connections of every pool (for ``alias`` only, if given)."""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if alias is None or key[0] == alias]
+    for pool in pools:
+        pool.close()
+
+
+# Connections inherited across fork() share their sockets with the parent.
+# The child must neither reuse nor close them (closing would end the
+# parent's sessions), so it keeps them referenced and starts empty pools.
+_inherited = []
+
+
+def _after_fork():
+    _inherited.extend(_pools.values())
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+@metrics.register_collector
+def _collect_pools():
+    for key, pool in list(_pools.items()):
+        for state, count in (('idle', pool.idle), ('in_use', pool.in_use)):
+            yield ('db_pool_connections', 'gauge', 'Pooled database connections by state.',
+                   {'alias': key[0], 'state': state}, count)
+
+
+class PooledDatabaseWrapperMixin:
+    """Mix into a backend's ``DatabaseWrapper`` to borrow connections from a ``ConnectionPool``."""
+
+    _pool_reused = False
+
+    def get_new_connection(self, conn_params):
+        pool, created = get_pool(self.alias, self.settings_dict)
+
+        def connect():
+            return super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params)
+
+        if created and pool.min_size:
+            pool.fill(connect)
+        connection, self._pool_reused = pool.acquire(connect, self.check_pooled_connection)
+        if self._pool_reused:
+            self.reuse_connection_state(connection)
+        return connection
+
+    def check_pooled_connection(self, connection):
+        """Raise if ``connection`` no longer works."""
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def reuse_connection_state(self, connection):
+        """Restore wrapper attributes that ``get_new_connection`` would have set."""
+
+    def init_connection_state(self):
+        # Session settings survive on pooled connections; only new ones need them
+        if not self._pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool, _ = get_pool(self.alias, self.settings_dict)
+        # Connections in an unknown state are closed rather than handed to the next request
+        broken = self.errors_occurred or self.in_atomic_block or self.needs_rollback or not self.autocommit
+        pool.release(self.connection, discard=broken)
+
+
+class PooledDatabaseCreationMixin:
+    """Close pooled connections before the test database is dropped."""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        return super()._destroy_test_db(test_database_name, verbosity)
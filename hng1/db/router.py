@@ -0,0 +1,172 @@
+"""Send reads to replicas, with read-your-writes stickiness per client.
+
+``ReplicaRouter`` routes reads made while handling a request to one of
+``DATABASE_REPLICAS`` (one replica per request, so a request sees a single
+snapshot). Reads go to the primary instead when:
+
+* the request has already written, or called ``use_primary()``
+* the read is inside a ``primary_reads()`` block
+* the primary connection is inside a transaction
+* the client wrote within the last ``READ_YOUR_WRITES_WINDOW`` seconds
+
+Rows that are kept in process-wide caches (authenticated users, membership
+versions) are read inside ``primary_reads()``. A lagging replica would
+otherwise leave every client with a stale copy for the cache's lifetime.
+
+Clients are identified by user id, and by email address for requests made
+before the user has a token. ``CachedJWTAuthentication`` calls ``identify()``
+for authenticated requests, the registration view calls it with the new
+user's id and email, and the login view with the email it is given. A request
+may identify several clients. ``ReadYourWritesMiddleware`` records the write
+time of each of them in the ``READ_YOUR_WRITES_CACHE`` cache when the request
+ends, so that cache must be shared by all worker processes. Reads outside a request (management
+commands, shells) always use the primary.
+"""
+import contextlib
+import contextvars
+import itertools
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from hng1 import metrics
+
+READS = metrics.Counter('db_routed_reads_total', 'Reads routed by the replica router, by database.', ('database',))
+
+_current = contextvars.ContextVar('db_routing', default=None)
+_primary_reads = contextvars.ContextVar('db_primary_reads', default=False)
+
+
+class _RequestState:
+    __slots__ = ('primary', 'wrote', 'clients', 'replica')
+
+    def __init__(self):
+        self.primary = False
+        self.wrote = False
+        self.clients = []
+        self.replica = None
+
+
+def _cache_key(client):
+    return f'hng1.db.wrote:{client}'
+
+
+def use_primary():
+    """Send the rest of the current request's reads to the primary."""
+    state = _current.get()
+    if state is not None:
+        state.primary = True
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send reads made inside the block to the primary, e.g. to fill a shared cache."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def email_client(email):
+    """Return the client key for a request that only knows an email address."""
+    return f'email:{str(email).strip().lower()}'
+
+
+def identify(client):
+    """Record a client the current request acts for.
+
+    Its reads go to the primary if the client wrote recently, and its writes
+    in this request are remembered under ``client``.
+    """
+    state = _current.get()
+    if state is None:
+        return
+    state.clients.append(client)
+    if not state.primary and caches[settings.READ_YOUR_WRITES_CACHE].get(_cache_key(client)):
+        state.primary = True
+
+
+class ReplicaRouter:
+    """Route reads to ``DATABASE_REPLICAS`` and everything else to the default database."""
+
+    def __init__(self):
+        self.replicas = list(settings.DATABASE_REPLICAS)
+        self._next_replica = itertools.cycle(self.replicas).__next__ if self.replicas else None
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        instance = hints.get('instance')
+        if (state is None or state.primary or self._next_replica is None or _primary_reads.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            database = DEFAULT_DB_ALIAS
+        elif instance is not None and instance._state.db:
+            # Related lookups follow the database their object came from
+            database = instance._state.db
+        else:
+            if state.replica is None:
+                state.replica = self._next_replica()
+            database = state.replica
+        READS.inc(database)
+        return database
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadYourWritesMiddleware:
+    """Track the request's routing state and remember clients that wrote.
+
+    Goes after ``AdmissionControlMiddleware`` and before anything that reads
+    the database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.window = settings.READ_YOUR_WRITES_WINDOW
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = _RequestState()
+        token = _current.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+            self._remember(state)
+
+    async def __acall__(self, request):
+        state = _RequestState()
+        token = _current.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            self._remember(state)
+
+    def _remember(self, state):
+        if state.wrote and state.clients and self.window > 0:
+            now = time.time()
+            caches[settings.READ_YOUR_WRITES_CACHE].set_many(
+                {_cache_key(client): now for client in state.clients}, self.window,
+            )
@@ -0,0 +1,100 @@
+"""Non-blocking, structured logging.
+
+Request threads only enqueue records; a background listener thread formats
+them and writes to the (possibly slow) stream.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueListener
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including ``extra`` fields."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass roughly ``rate`` (0.0 - 1.0) of the records it sees."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class QueueingHandler(logging.Handler):
+    """Hand records to a background thread that formats and writes them.
+
+    ``emit`` never blocks: when the queue is full the record is dropped and
+    counted in ``dropped``. Message arguments are formatted on the listener
+    thread, so pass immutable values as logging arguments.
+
+    The listener thread does not survive ``fork()``, so a forked child (e.g.
+    a worker of a preloading server) starts its own listener and queue.
+    """
+
+    def __init__(self, stream=None, queue_size=10000, level=logging.NOTSET):
+        super().__init__(level)
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self._closed = False
+        self._start_listener()
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self._after_fork)
+        self.dropped = 0
+
+    def _start_listener(self):
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _after_fork(self):
+        # The parent's queue may have been locked mid-operation; start afresh
+        if not self._closed:
+            self._start_listener()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self.listener._thread is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        self._closed = True
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,376 @@
+"""Prometheus metrics in the text exposition format, served at ``/metrics``.
+
+Recording never takes a lock: every thread increments its own shard of
+counters and histogram buckets, and shards are only summed when the
+endpoint is scraped. Shards of finished threads are folded into a retired
+shard, so their counts are kept.
+
+With ``METRICS_DIR`` set, each worker process also writes a snapshot of its
+metrics to ``<METRICS_DIR>/<pid>-<start time>.json`` every
+``METRICS_FLUSH_INTERVAL`` seconds, and a scrape of any worker adds up the
+snapshots of all of them. Counters and histograms of exited workers are
+kept. Gauges are dropped once a snapshot is older than three flush
+intervals. Clear the directory when the server is (re)started.
+
+``Counter`` and ``Histogram`` are recorded on the request path. Values that
+already exist elsewhere (cache counters, circuit state, open connections)
+are read at snapshot time by functions passed to ``register_collector``.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger('hng1.metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name -> (type, help, label names, buckets)
+_families = {}
+_collectors = []
+
+
+class _Shard:
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()  # guards _shards and _retired; taken once per thread and on scrapes
+_retired = _Shard(None)
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+def _register(name, kind, help, labelnames, buckets=None):
+    if name in _families:
+        raise ValueError(f'metric {name} is already registered')
+    _families[name] = (kind, help, tuple(labelnames), buckets)
+
+
+class Counter:
+    """A monotonically increasing count; ``inc`` takes the label values positionally."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        _register(name, 'counter', help, labelnames)
+
+    def inc(self, *labels, amount=1):
+        counters = _shard().counters
+        key = (self.name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+
+class Histogram:
+    """Observations counted into ``buckets`` (upper bounds, in seconds for latencies)."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        _register(name, 'histogram', help, labelnames, self.buckets)
+
+    def observe(self, value, *labels):
+        histograms = _shard().histograms
+        key = (self.name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            # one count per bucket plus +Inf, then the sum
+            entry = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+
+def register_collector(collect):
+    """Call ``collect()`` on every snapshot.
+
+    It returns ``(name, type, help, labels, value)`` tuples, where ``type``
+    is ``'counter'`` or ``'gauge'`` and ``labels`` is a dict.
+    """
+    _collectors.append(collect)
+    return collect
+
+
+def register_cache(name, cache):
+    """Export the counters of an ``api.cache`` cache under ``cache="<name>"``."""
+    def collect():
+        stats = cache.stats()
+        labels = {'cache': name}
+        yield 'cache_hits_total', 'counter', 'Cache lookups that found a live entry.', labels, stats['hits']
+        yield 'cache_misses_total', 'counter', 'Cache lookups that found no live entry.', labels, stats['misses']
+        yield 'cache_evictions_total', 'counter', 'Entries evicted to stay within maxsize.', labels, stats['evictions']
+        yield 'cache_entries', 'gauge', 'Entries currently cached.', labels, stats['size']
+    return register_collector(collect)
+
+
+def _merge_shard(target, shard):
+    for key, value in dict(shard.counters).items():
+        target.counters[key] = target.counters.get(key, 0) + value
+    for key, entry in dict(shard.histograms).items():
+        existing = target.histograms.get(key)
+        target.histograms[key] = list(entry) if existing is None else [a + b for a, b in zip(existing, entry)]
+
+
+def snapshot():
+    """Return this process's metrics as a JSON-serializable dict."""
+    total = _Shard(None)
+    with _shards_lock:
+        for shard in list(_shards):
+            if not shard.thread.is_alive():
+                _merge_shard(_retired, shard)
+                _shards.remove(shard)
+        for shard in _shards + [_retired]:
+            _merge_shard(total, shard)
+
+    samples = []
+    for store in (total.counters, total.histograms):
+        for (name, labels), value in store.items():
+            samples.append([name, dict(zip(_families[name][2], labels)), value])
+    families = {name: [kind, help, buckets] for name, (kind, help, _, buckets) in _families.items()}
+    for collect in _collectors:
+        try:
+            for name, kind, help, labels, value in collect():
+                families.setdefault(name, [kind, help, None])
+                samples.append([name, labels, value])
+        except Exception:
+            logger.exception('metrics collector failed')
+    return {'pid': os.getpid(), 'time': time.time(), 'families': families, 'samples': samples}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def render(snapshots, now=None, gauge_max_age=None):
+    """Merge process snapshots and return the exposition text.
+
+    Gauges from snapshots older than ``gauge_max_age`` seconds are skipped.
+    """
+    now = time.time() if now is None else now
+    families = {}
+    merged = {}
+    for snap in snapshots:
+        families.update(snap['families'])
+        stale = gauge_max_age is not None and now - snap['time'] > gauge_max_age
+        for name, labels, value in snap['samples']:
+            if stale and families[name][0] == 'gauge':
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(existing, value)]
+            else:
+                merged[key] = existing + value
+
+    # Hit ratios are derived after merging so they cover every process
+    families['cache_hit_ratio'] = ['gauge', 'Fraction of cache lookups that were hits.', None]
+    for (name, labels), hits in list(merged.items()):
+        if name == 'cache_hits_total':
+            lookups = hits + merged.get(('cache_misses_total', labels), 0)
+            merged[('cache_hit_ratio', labels)] = hits / lookups if lookups else 0.0
+
+    by_family = {}
+    for (name, labels), value in merged.items():
+        by_family.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_family):
+        kind, help, buckets = families[name]
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_family[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# Multi-process snapshots
+
+_process_started = time.time()
+_flusher = None
+
+
+def _snapshot_path(directory):
+    return os.path.join(directory, f'{os.getpid()}-{int(_process_started * 1000)}.json')
+
+
+def write_snapshot(directory, snap=None):
+    """Atomically write this process's snapshot into ``directory``."""
+    snap = snap or snapshot()
+    path = _snapshot_path(directory)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(snap, f)
+    os.replace(tmp, path)
+    return snap
+
+
+def read_snapshots(directory, exclude=None):
+    snaps = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        if path == exclude:
+            continue
+        try:
+            with open(path) as f:
+                snaps.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # removed or replaced mid-read
+    return snaps
+
+
+def _flush_forever(directory, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot(directory)
+        except Exception:
+            logger.exception('writing metrics snapshot failed')
+
+
+def start_flusher():
+    """Start this process's snapshot writer if ``METRICS_DIR`` is set (once per process)."""
+    global _flusher
+    if not settings.METRICS_DIR or _flusher is not None:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _flusher = threading.Thread(target=_flush_forever, name='metrics-flusher', daemon=True,
+                                args=(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL))
+    _flusher.start()
+
+
+def _after_fork():
+    # A forked worker starts from zero rather than re-reporting its parent's counts
+    global _flusher, _retired, _process_started
+    with _shards_lock:
+        _shards.clear()
+        _retired = _Shard(None)
+    if hasattr(_local, 'shard'):
+        del _local.shard
+    _process_started = time.time()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=403)
+    snaps = [snapshot()]
+    directory = settings.METRICS_DIR
+    if directory:
+        write_snapshot(directory, snaps[0])
+        snaps += read_snapshots(directory, exclude=_snapshot_path(directory))
+    text = render(snaps, gauge_max_age=3 * settings.METRICS_FLUSH_INTERVAL)
+    return HttpResponse(text, content_type=CONTENT_TYPE)
+
+
+# Requests
+
+REQUESTS = Counter('http_requests_total', 'HTTP responses by route, method and status.',
+                   ('route', 'method', 'status'))
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to produce a response, by route.',
+                            ('route', 'method'))
+
+_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class MetricsMiddleware:
+    """Count responses and time them per URL route (the pattern, not the path)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        start_flusher()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    def _record(self, request, response, started):
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        method = request.method if request.method in _METHODS else 'other'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, method)
+        REQUESTS.inc(route, method, str(response.status_code))
+
+
+# Database connections
+
+DB_CONNECTIONS_OPENED = Counter('db_connections_opened_total', 'Database connections opened.', ('alias',))
+_db_wrappers = weakref.WeakSet()
+
+
+@receiver(connection_created)
+def _track_connection(sender, connection, **kwargs):
+    # Connections borrowed from hng1.db.pool are counted by the pool's own metrics
+    if not getattr(connection, '_pool_reused', False):
+        DB_CONNECTIONS_OPENED.inc(connection.alias)
+    _db_wrappers.add(connection)
+
+
+@register_collector
+def _collect_connections():
+    open_by_alias = {}
+    for wrapper in list(_db_wrappers):
+        if wrapper.connection is not None:
+            open_by_alias[wrapper.alias] = open_by_alias.get(wrapper.alias, 0) + 1
+    for alias, count in open_by_alias.items():
+        yield 'db_connections_open', 'gauge', 'Database connections currently open.', {'alias': alias}, count
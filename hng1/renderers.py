@@ -0,0 +1,70 @@
+"""orjson-backed drop-in replacements for DRF's JSON renderer and parser.
+
+Output matches ``rest_framework.renderers.JSONRenderer`` for compact UTF-8
+responses, with one exception: floats that Python writes with an exponent
+are written in orjson's shortest form, e.g. ``1e16`` rather than ``1e+16``
+and ``1e-7`` rather than ``1e-07``. They decode to the same value. NaN and
+infinity raise ``ValueError``, as with DRF's strict encoder, instead of
+being written as ``null``. Anything orjson cannot reproduce (indented
+output, ``UNICODE_JSON = False``, ``STRICT_JSON = False``, non UTF-8
+request bodies) and environments without orjson fall back to the stock
+classes.
+"""
+import math
+
+from django.conf import settings
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _has_non_finite(data):
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    # DRF's encoder formats the values orjson passes through (datetimes with
+    # millisecond precision and "Z", Decimal, lazy strings, querysets, ...)
+    _default = encoders.JSONEncoder().default
+    _options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self._default, option=self._options)
+        # orjson writes NaN and infinity as null; only then is the payload walked
+        if b'null' in ret and _has_non_finite(data):
+            raise ValueError('Out of range float values are not JSON compliant')
+        # Match DRF: escape the line/paragraph separators for JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not api_settings.STRICT_JSON:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
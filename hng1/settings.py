@@ -37,18 +37,56 @@ INSTALLED_APPS = [
 
 
 
+# Use the orjson-backed renderer/parser; set FAST_JSON=false to fall back to
+# DRF's stock JSONRenderer/JSONParser
+FAST_JSON = os.getenv('FAST_JSON', 'True').lower() in ('1', 'true', 'yes')
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'hng1.renderers.FastJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'hng1.renderers.FastJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user_management.authentication.CachedJWTAuthentication',
     ),
 }
 
+# GET /api/organisations/ page size (default and maximum for ?page_size=)
+ORGANIZATION_PAGE_SIZE = int(os.getenv('ORGANIZATION_PAGE_SIZE', 50))
+ORGANIZATION_MAX_PAGE_SIZE = int(os.getenv('ORGANIZATION_MAX_PAGE_SIZE', 500))
+
+# POST /api/organisations/<pk>/users/ with "userIds": maximum ids per request
+# and membership rows per INSERT
+MEMBERSHIP_BULK_MAX_USERS = int(os.getenv('MEMBERSHIP_BULK_MAX_USERS', 10000))
+MEMBERSHIP_BATCH_SIZE = int(os.getenv('MEMBERSHIP_BATCH_SIZE', 1000))
+
+# Admin exports (/api/exports/...): rows fetched per database round trip and
+# approximate bytes per chunk written to the client
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+EXPORT_BUFFER_BYTES = int(os.getenv('EXPORT_BUFFER_BYTES', 64 * 1024))
+
+# CachedJWTAuthentication: verified tokens are cached until they expire and
+# users for JWT_USER_CACHE_TTL seconds (or until saved/deleted)
+JWT_TOKEN_CACHE_SIZE = int(os.getenv('JWT_TOKEN_CACHE_SIZE', 10000))
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', 10000))
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 300))
+
+# Opt-in: embed the user's organisation ids and membership version in access
+# tokens so organisation permission checks need no query
+JWT_MEMBERSHIP_CLAIMS = os.getenv('JWT_MEMBERSHIP_CLAIMS', 'False').lower() in ('1', 'true', 'yes')
+JWT_MEMBERSHIP_CLAIM_MAX_ORGS = int(os.getenv('JWT_MEMBERSHIP_CLAIM_MAX_ORGS', 50))
+# Cache holding each user's current membership version. Membership changes
+# must be seen by every worker process, so this must name a cache they all
+# share; with JWT_MEMBERSHIP_CLAIMS on, a LocMemCache fails the system checks.
+MEMBERSHIP_VERSION_CACHE = os.getenv('MEMBERSHIP_VERSION_CACHE', 'default')
+
 SIMPLE_JWT = {
     
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=1440),
@@ -69,6 +107,10 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'hng1.timing.ServerTimingMiddleware',
+    'hng1.metrics.MetricsMiddleware',
+    'hng1.admission.AdmissionControlMiddleware',
+    'hng1.db.router.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -102,14 +144,67 @@ WSGI_APPLICATION = 'hng1.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# With DB_POOL on, the PostgreSQL and MySQL engines are swapped for the
+# pooled wrappers in hng1.db.backends (see hng1.db.pool): each process keeps
+# DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE open connections per database and
+# requests borrow one instead of connecting. Keep CONN_MAX_AGE at 0 so the
+# connection goes back to the pool when the request ends. Opt-in: the pooled
+# backends are only tested against SQLite so far, not psycopg2 or mysqlclient.
+DB_POOL = os.getenv('DB_POOL', 'False').lower() in ('1', 'true', 'yes')
+POOLED_DB_ENGINES = {
+    'django.db.backends.postgresql': 'hng1.db.backends.postgresql',
+    'django.db.backends.mysql': 'hng1.db.backends.mysql',
+}
+DB_ENGINE = os.getenv('DB_ENGINE')
+if DB_POOL:
+    DB_ENGINE = POOLED_DB_ENGINES.get(DB_ENGINE, DB_ENGINE)
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+            # Seconds to wait for a free connection before failing the request
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            # Ping a connection before reuse if it has been idle this long
+            'HEALTH_CHECK_INTERVAL': float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        },
+    }
+}
+
+# Read replicas: DB_REPLICA_HOSTS is a comma-separated list of hosts serving
+# copies of the default database (same name and credentials). Reads made by
+# requests are spread over them by hng1.db.router.ReplicaRouter. A client
+# that wrote reads from the primary for READ_YOUR_WRITES_WINDOW seconds
+# afterwards; with several worker processes, READ_YOUR_WRITES_CACHE must name
+# a cache shared by all of them.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(',') if h.strip()):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+DATABASE_ROUTERS = ['hng1.db.router.ReplicaRouter'] if DATABASE_REPLICAS else []
+READ_YOUR_WRITES_WINDOW = float(os.getenv('READ_YOUR_WRITES_WINDOW', 5))
+READ_YOUR_WRITES_CACHE = os.getenv('READ_YOUR_WRITES_CACHE', 'default')
+
+# Default cache. LocMemCache is private to each process; with several worker
+# processes point CACHE_BACKEND / CACHE_LOCATION at a shared backend, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://host:6379.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -130,6 +225,23 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
     },
 ]
+# Password hashing. PASSWORD_HASHER is the preferred hasher; the others are
+# kept so existing hashes still verify (and are upgraded on login).
+# PASSWORD_HASHING_POOL is 'thread', 'process' or 'inline'.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'user_management.hashers.ConfigurablePBKDF2PasswordHasher')
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'user_management.hashers.ConfigurablePBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ) if hasher != PASSWORD_HASHER
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+PASSWORD_HASHING_POOL = os.getenv('PASSWORD_HASHING_POOL', 'thread')
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1))
+
 AUTHENTICATION_BACKENDS = (
     'user_management.backends.EmailBackend',
     'django.contrib.auth.backends.ModelBackend',
@@ -169,4 +281,161 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 WEATHERAPI_KEY = os.getenv('WEATHERAPI_KEY')
 
 # IPinfo API key
-IPINFO_API_KEY = os.getenv('IPINFO_API_KEY')
\ No newline at end of file
+IPINFO_API_KEY = os.getenv('IPINFO_API_KEY')
+
+# IP -> city lookup cache (size in entries, TTLs in seconds)
+IPINFO_CACHE_SIZE = int(os.getenv('IPINFO_CACHE_SIZE', 10000))
+IPINFO_CACHE_TTL = int(os.getenv('IPINFO_CACHE_TTL', 86400))
+IPINFO_NEGATIVE_CACHE_TTL = int(os.getenv('IPINFO_NEGATIVE_CACHE_TTL', 60))
+
+# City -> weather cache. Entries are fresh for WEATHER_CACHE_TTL seconds and
+# then served stale for up to WEATHER_CACHE_STALE_TTL more while refreshing.
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', 5000))
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 600))
+WEATHER_CACHE_STALE_TTL = int(os.getenv('WEATHER_CACHE_STALE_TTL', 900))
+
+# Serve /api/hello with the native async view (use with an ASGI server)
+HELLO_ASYNC = os.getenv('HELLO_ASYNC', 'False').lower() in ('1', 'true', 'yes')
+
+# Upstream API base URLs (overridable to point at local stand-ins)
+IPINFO_URL = os.getenv('IPINFO_URL', 'https://ipinfo.io')
+WEATHERAPI_URL = os.getenv('WEATHERAPI_URL', 'http://api.weatherapi.com/v1')
+
+# Outbound HTTP: max pooled connections per process and per-call timeouts (seconds)
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 100))
+IPINFO_TIMEOUT = float(os.getenv('IPINFO_TIMEOUT', 2.0))
+WEATHERAPI_TIMEOUT = float(os.getenv('WEATHERAPI_TIMEOUT', 2.0))
+
+# Total time budget for all upstream calls made by one request (seconds),
+# retries for transient failures, and circuit breaker tuning
+UPSTREAM_DEADLINE = float(os.getenv('UPSTREAM_DEADLINE', 3.0))
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', 0.1))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))
+
+# IP -> city backend: 'ipinfo' (remote API) or 'local' (offline index built
+# with `manage.py build_geoip_index`)
+GEOIP_BACKEND = os.getenv('GEOIP_BACKEND', 'ipinfo')
+GEOIP_INDEX_PATH = os.getenv('GEOIP_INDEX_PATH', os.path.join(BASE_DIR, 'geoip.idx'))
+
+# Background refresh of the most requested cities' weather. Every
+# WEATHER_PREFETCH_INTERVAL seconds, up to WEATHER_PREFETCH_MAX_CALLS of the
+# WEATHER_PREFETCH_TOP_K hottest cities that go stale within
+# WEATHER_PREFETCH_AHEAD seconds are refreshed, spaced
+# WEATHER_PREFETCH_MIN_CALL_INTERVAL seconds apart. The call budget is per
+# process: each worker running the prefetcher spends its own.
+WEATHER_PREFETCH_ENABLED = os.getenv('WEATHER_PREFETCH_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+WEATHER_PREFETCH_TOP_K = int(os.getenv('WEATHER_PREFETCH_TOP_K', 50))
+WEATHER_PREFETCH_INTERVAL = float(os.getenv('WEATHER_PREFETCH_INTERVAL', 30))
+WEATHER_PREFETCH_AHEAD = float(os.getenv('WEATHER_PREFETCH_AHEAD', 60))
+WEATHER_PREFETCH_MAX_CALLS = int(os.getenv('WEATHER_PREFETCH_MAX_CALLS', 20))
+WEATHER_PREFETCH_MIN_CALL_INTERVAL = float(os.getenv('WEATHER_PREFETCH_MIN_CALL_INTERVAL', 0.1))
+# Cache shared by all processes that holds the weather cache and the merged
+# hot-city list instead of process memory. Required by the prefetch_weather
+# command, which warms the workers' cache from a single process (and so with
+# a single call budget) in place of WEATHER_PREFETCH_ENABLED.
+WEATHER_SHARED_CACHE = os.getenv('WEATHER_SHARED_CACHE', '')
+
+# POST /api/hello/batch: maximum items per request and lookup threads per process
+HELLO_BATCH_MAX_ITEMS = int(os.getenv('HELLO_BATCH_MAX_ITEMS', 500))
+HELLO_BATCH_WORKERS = int(os.getenv('HELLO_BATCH_WORKERS', 16))
+
+# Logging: records are queued on the request thread and written as JSON
+# lines by a background thread. LOG_CLIENT_IP_SAMPLE_RATE is the fraction of
+# per-request client IP lines that are kept.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_CLIENT_IP_SAMPLE_RATE = float(os.getenv('LOG_CLIENT_IP_SAMPLE_RATE', 0.01))
+
+# Fraction of requests (0.0 - 1.0) that get a Server-Timing header and a
+# 'request timing' log line breaking down DB, upstream, hashing and render
+# time; 0 turns the instrumentation off
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', 0.0))
+
+# /metrics (Prometheus text format). With several worker processes set
+# METRICS_DIR to a directory shared by them (emptied on restart); each
+# worker writes its snapshot there every METRICS_FLUSH_INTERVAL seconds.
+# When METRICS_TOKEN is set, scrapes must send "Authorization: Bearer <token>".
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Admission control: per path prefix, at most 'limit' requests in flight
+# (adapting between min_limit and max_limit to target_latency), up to
+# 'queue' more waiting for 'timeout' seconds; the rest get 503 + Retry-After.
+# The longest matching prefix wins, so /api/hello/batch has its own limiter
+# and its slower requests don't drag down the single-greeting limit.
+# Login and registration are sized to the password hashing pool.
+ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', 'True').lower() in ('1', 'true', 'yes')
+AUTH_CONCURRENCY_LIMIT = int(os.getenv('AUTH_CONCURRENCY_LIMIT', 2 * PASSWORD_HASHING_WORKERS))
+HELLO_CONCURRENCY_LIMIT = int(os.getenv('HELLO_CONCURRENCY_LIMIT', 64))
+HELLO_BATCH_CONCURRENCY_LIMIT = int(os.getenv('HELLO_BATCH_CONCURRENCY_LIMIT', 8))
+_auth_limits = {
+    'limit': AUTH_CONCURRENCY_LIMIT,
+    'max_limit': 2 * AUTH_CONCURRENCY_LIMIT,
+    'queue': 4 * AUTH_CONCURRENCY_LIMIT,
+    'timeout': float(os.getenv('AUTH_QUEUE_TIMEOUT', 2.0)),
+    'target_latency': float(os.getenv('AUTH_TARGET_LATENCY', 0.5)),
+}
+ADMISSION_LIMITS = {
+    '/auth/login/': _auth_limits,
+    '/auth/register/': _auth_limits,
+    '/api/hello': {
+        'limit': HELLO_CONCURRENCY_LIMIT,
+        'max_limit': 4 * HELLO_CONCURRENCY_LIMIT,
+        'queue': 4 * HELLO_CONCURRENCY_LIMIT,
+        'timeout': float(os.getenv('HELLO_QUEUE_TIMEOUT', 1.0)),
+        'target_latency': float(os.getenv('HELLO_TARGET_LATENCY', 0.3)),
+    },
+    '/api/hello/batch': {
+        'limit': HELLO_BATCH_CONCURRENCY_LIMIT,
+        'max_limit': 2 * HELLO_BATCH_CONCURRENCY_LIMIT,
+        'queue': 2 * HELLO_BATCH_CONCURRENCY_LIMIT,
+        'timeout': float(os.getenv('HELLO_BATCH_QUEUE_TIMEOUT', 2.0)),
+        # A batch is bounded by the upstream deadline, not by one lookup
+        'target_latency': float(os.getenv('HELLO_BATCH_TARGET_LATENCY', UPSTREAM_DEADLINE)),
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'hng1.log.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sample_client_ip': {
+            '()': 'hng1.log.SamplingFilter',
+            'rate': LOG_CLIENT_IP_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'queue': {
+            'class': 'hng1.log.QueueingHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'api.client_ip': {
+            'filters': ['sample_client_ip'],
+        },
+        'hng1': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'user_management': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,529 @@
+import datetime
+import decimal
+import io
+import json
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from .log import JSONFormatter, QueueingHandler, SamplingFilter
+from .renderers import FastJSONRenderer, FastJSONParser
+from . import admission, metrics, timing
+from .db import pool as db_pool, router as db_router
+
+
+class LoggingTests(SimpleTestCase):
+    def make_logger(self, handler):
+        logger = logging.getLogger('hng1.tests.log')
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        self.addCleanup(handler.close)
+        return logger
+
+    def test_records_are_written_as_json_by_the_listener(self):
+        stream = io.StringIO()
+        handler = QueueingHandler(stream=stream)
+        handler.setFormatter(JSONFormatter())
+        logger = self.make_logger(handler)
+
+        logger.info('Client IP: %s', '1.2.3.4', extra={'client_ip': '1.2.3.4'})
+        handler.flush()
+
+        record = json.loads(stream.getvalue())
+        self.assertEqual(record['message'], 'Client IP: 1.2.3.4')
+        self.assertEqual(record['client_ip'], '1.2.3.4')
+        self.assertEqual(record['level'], 'INFO')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = QueueingHandler(stream=io.StringIO(), queue_size=1)
+        handler.listener.stop()
+        logger = self.make_logger(handler)
+        logger.info('one')
+        logger.info('two')
+        self.assertEqual(handler.dropped, 1)
+
+    def test_forked_child_starts_its_own_listener(self):
+        read_fd, write_fd = os.pipe()
+        stream = os.fdopen(write_fd, 'w')
+        handler = QueueingHandler(stream=stream)
+        logger = self.make_logger(handler)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logger.info('from the child')
+                # Bounded wait: without a listener the record is never written
+                deadline = time.monotonic() + 5
+                while handler.queue.unfinished_tasks and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        handler.close()
+        stream.close()
+        with os.fdopen(read_fd) as pipe:
+            self.assertEqual(pipe.read(), 'from the child\n')
+
+    def test_sampling_filter(self):
+        record = logging.makeLogRecord({})
+        self.assertTrue(SamplingFilter(rate=1).filter(record))
+        self.assertFalse(SamplingFilter(rate=0).filter(record))
+        with patch('hng1.log.random.random', return_value=0.3):
+            self.assertTrue(SamplingFilter(rate=0.5).filter(record))
+            self.assertFalse(SamplingFilter(rate=0.2).filter(record))
+
+
+class FastJSONTests(SimpleTestCase):
+    def test_renders_identically_to_stock_renderer(self):
+        payloads = [
+            {
+                'status': 'success',
+                'data': {
+                    'userId': uuid.uuid4(),
+                    'joined': datetime.datetime(2024, 7, 7, 10, 43, 1, 123456, tzinfo=datetime.timezone.utc),
+                    'day': datetime.date(2024, 7, 7),
+                    'balance': decimal.Decimal('10.50'),
+                    'name': 'Adé\u2028',
+                    1: None,
+                },
+            },
+            [{'orgId': str(uuid.uuid4()), 'name': "Ada's Organisation", 'description': None}] * 3,
+        ]
+        for payload in payloads:
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_float_edge_cases(self):
+        for value in (30.5, 0.1, -0.0, 1e15):
+            self.assertEqual(FastJSONRenderer().render({'t': value}), JSONRenderer().render({'t': value}))
+        # Exponent forms are orjson's shortest ones; the decoded values are equal
+        self.assertEqual(FastJSONRenderer().render([1e16, 1e-7]), b'[1e16,1e-7]')
+        self.assertEqual(JSONRenderer().render([1e16, 1e-7]), b'[1e+16,1e-07]')
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'t': [value]})
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'t': [value]})
+
+    def test_indented_output_falls_back(self):
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"email": "a@b.c"}')), {'email': 'a@b.c'})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"email": '))
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"n": NaN}'))
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        from user_management.models import User
+        User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+
+    def login(self):
+        return self.client.post('/auth/login/', {'email': 'a@example.com', 'password': 'pw'},
+                                content_type='application/json')
+
+    def test_sampled_request_reports_breakdown(self):
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=1.0), \
+                self.assertLogs('hng1.timing', 'INFO') as logs:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        metrics = {part.split(';')[0] for part in response['Server-Timing'].split(', ')}
+        self.assertEqual(metrics, {'db', 'hash', 'render', 'total'})
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        record = logs.records[0]
+        self.assertEqual((record.path, record.status, record.db_queries), ('/auth/login/', 200, 1))
+        self.assertGreater(record.hash_ms, 0)
+
+    def test_unsampled_request_has_no_header(self):
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=0.0):
+            response = self.login()
+        self.assertNotIn('Server-Timing', response)
+
+    def test_timed_outside_a_sampled_request_is_a_no_op(self):
+        self.assertIsNone(timing.current())
+        with timing.timed('ipinfo'):
+            pass
+        self.assertIsNone(timing.current())
+
+
+def scrape_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+class MetricsTests(SimpleTestCase):
+    counter = metrics.Counter('test_events_total', 'Events seen by the tests.', ('kind',))
+    histogram = metrics.Histogram('test_latency_seconds', 'Test latencies.', buckets=(0.1, 1.0))
+
+    def test_counts_from_all_threads_are_kept(self):
+        before = scrape_value(metrics.render([metrics.snapshot()]), 'test_events_total{kind="thread"}')
+        threads = [threading.Thread(target=lambda: [self.counter.inc('thread') for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        after = scrape_value(metrics.render([metrics.snapshot()]), 'test_events_total{kind="thread"}')
+        self.assertEqual(after - before, 400)
+
+    def test_histogram_exposition(self):
+        snap = {'time': 0, 'families': {'h': ['histogram', 'H.', [0.1, 1.0]]},
+                'samples': [['h', {'route': 'x'}, [2, 1, 1, 5.25]]]}
+        text = metrics.render([snap, snap])
+        self.assertIn('# TYPE h histogram', text)
+        self.assertIn('h_bucket{route="x",le="0.1"} 4', text)
+        self.assertIn('h_bucket{route="x",le="1.0"} 6', text)
+        self.assertIn('h_bucket{route="x",le="+Inf"} 8', text)
+        self.assertIn('h_sum{route="x"} 10.5', text)
+        self.assertIn('h_count{route="x"} 8', text)
+
+    def test_snapshots_are_merged_and_stale_gauges_dropped(self):
+        families = {'c_total': ['counter', 'C.', None], 'g': ['gauge', 'G.', None]}
+        fresh = {'time': 100, 'families': families, 'samples': [['c_total', {}, 1], ['g', {}, 2]]}
+        stale = {'time': 10, 'families': families, 'samples': [['c_total', {}, 3], ['g', {}, 5]]}
+        text = metrics.render([fresh, stale], now=100, gauge_max_age=15)
+        self.assertEqual(scrape_value(text, 'c_total'), 4)
+        self.assertEqual(scrape_value(text, 'g'), 2)
+
+    def test_cache_hit_ratio(self):
+        families = {'cache_hits_total': ['counter', 'H.', None], 'cache_misses_total': ['counter', 'M.', None]}
+        snap = {'time': 0, 'families': families, 'samples': [
+            ['cache_hits_total', {'cache': 'c'}, 3], ['cache_misses_total', {'cache': 'c'}, 1]]}
+        self.assertEqual(scrape_value(metrics.render([snap]), 'cache_hit_ratio{cache="c"}'), 0.75)
+
+    def test_endpoint_aggregates_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = {'pid': 1, 'time': time.time(), 'families': {'test_events_total': ['counter', 'E.', None]},
+                     'samples': [['test_events_total', {'kind': 'other'}, 7]]}
+            with open(os.path.join(directory, '1-0.json'), 'w') as f:
+                json.dump(other, f)
+            with override_settings(METRICS_DIR=directory):
+                response = metrics.metrics_view(RequestFactory().get('/metrics'))
+                self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertEqual(scrape_value(response.content.decode(), 'test_events_total{kind="other"}'), 7)
+
+    def test_token_is_required_when_configured(self):
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(metrics.metrics_view(RequestFactory().get('/metrics')).status_code, 403)
+            response = metrics.metrics_view(RequestFactory().get('/metrics', HTTP_AUTHORIZATION='Bearer secret'))
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def test_requests_are_counted_by_route(self):
+        sample = 'http_requests_total{method="GET",route="api/users/<str:pk>/",status="401"}'
+        before = scrape_value(self.client.get('/metrics').content.decode(), sample)
+        self.client.get('/api/users/abc/')
+        text = self.client.get('/metrics').content.decode()
+        self.assertEqual(scrape_value(text, sample) - before, 1)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="api/users/<str:pk>/",le="+Inf"}', text)
+        self.assertIn('cache_hit_ratio{cache="jwt_user"}', text)
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_queue_then_shed(self):
+        limiter = admission.AdaptiveLimiter(limit=1, queue_size=1, timeout=5)
+        self.assertEqual(limiter.acquire(), 'ok')
+        outcomes = []
+        waiter = threading.Thread(target=lambda: outcomes.append(limiter.acquire()))
+        waiter.start()
+        while limiter.queued == 0:
+            time.sleep(0.001)
+        self.assertEqual(limiter.acquire(), 'queue_full')
+        limiter.release(0.0)
+        waiter.join()
+        self.assertEqual(outcomes, ['ok'])
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_wait_times_out(self):
+        limiter = admission.AdaptiveLimiter(limit=1, queue_size=1, timeout=0.01)
+        limiter.acquire()
+        self.assertEqual(limiter.acquire(), 'timeout')
+        self.assertEqual(limiter.queued, 0)
+
+    def test_async_waiter_is_granted_by_a_thread(self):
+        limiter = admission.AdaptiveLimiter(limit=1, queue_size=1, timeout=5)
+        limiter.acquire()
+
+        async def wait():
+            pending = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            threading.Thread(target=limiter.release, args=(0.0,)).start()
+            return await pending
+
+        self.assertEqual(asyncio.run(wait()), 'ok')
+
+    def test_limit_adapts_to_latency(self):
+        now = [0.0]
+        limiter = admission.AdaptiveLimiter(limit=10, min_limit=2, max_limit=11, target_latency=0.5,
+                                            decrease_factor=0.5, timer=lambda: now[0])
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(1.0)
+        self.assertEqual(limiter.limit, 5)  # one decrease per target_latency window
+        now[0] = 1.0
+        limiter.acquire()
+        limiter.release(1.0)
+        self.assertEqual(limiter.limit, 2.5)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.1)
+        self.assertEqual(limiter.limit, 11)
+
+
+class AdmissionControlMiddlewareTests(SimpleTestCase):
+    def test_full_route_is_shed_with_retry_after(self):
+        limits = {'/auth/login/': {'limit': 1, 'queue': 0, 'target_latency': 1.0}}
+        with override_settings(ADMISSION_CONTROL=True, ADMISSION_LIMITS=limits):
+            middleware = admission.AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        limiter = middleware.limiters[0][1]
+        factory = RequestFactory()
+
+        self.assertEqual(middleware(factory.post('/auth/login/')).status_code, 200)
+        limiter.acquire()
+        response = middleware(factory.post('/auth/login/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(middleware(factory.get('/api/organisations/')).status_code, 200)
+
+    def test_slow_route_does_not_shrink_another_routes_limit(self):
+        limits = {
+            '/api/hello': {'limit': 10, 'target_latency': 0.01, 'decrease_factor': 0.5},
+            '/api/hello/batch': {'limit': 2, 'target_latency': 1.0, 'decrease_factor': 0.5},
+        }
+
+        def get_response(request):
+            time.sleep(0.02)
+            return HttpResponse('ok')
+
+        with override_settings(ADMISSION_CONTROL=True, ADMISSION_LIMITS=limits):
+            middleware = admission.AdmissionControlMiddleware(get_response)
+        limiters = dict(middleware.limiters)
+        self.assertEqual(middleware(RequestFactory().post('/api/hello/batch')).status_code, 200)
+        self.assertEqual(limiters['/api/hello'].limit, 10)
+        self.assertEqual(limiters['/api/hello'].in_flight, 0)
+        self.assertEqual(limiters['/api/hello/batch'].in_flight, 0)
+
+    def test_batch_greetings_have_their_own_limiter(self):
+        with override_settings(ADMISSION_CONTROL=True):
+            middleware = admission.AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        self.assertEqual(middleware._limiter_for('/api/hello/batch')[0], '/api/hello/batch')
+        self.assertEqual(middleware._limiter_for('/api/hello')[0], '/api/hello')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.pool = db_pool.ConnectionPool(alias='test', max_size=2, timeout=0.01, max_lifetime=100,
+                                           max_idle=50, health_check_interval=10, timer=lambda: self.now[0])
+        self.opened = []
+        self.checked = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def check(self, connection):
+        self.checked.append(connection)
+        if connection.closed:
+            raise RuntimeError('dead')
+
+    def acquire(self):
+        return self.pool.acquire(self.connect, self.check)
+
+    def test_connections_are_reused(self):
+        first, reused = self.acquire()
+        self.assertFalse(reused)
+        self.pool.release(first)
+        second, reused = self.acquire()
+        self.assertIs(second, first)
+        self.assertTrue(reused)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_checkout_times_out_at_max_size(self):
+        self.acquire()
+        self.acquire()
+        with self.assertRaises(db_pool.PoolTimeout):
+            self.acquire()
+
+    def test_waiter_gets_a_released_connection(self):
+        self.pool.timeout = 5
+        first, _ = self.acquire()
+        self.acquire()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(self.acquire()[0]))
+        waiter.start()
+        self.pool.release(first)
+        waiter.join()
+        self.assertEqual(result, [first])
+
+    def test_idle_connections_are_health_checked(self):
+        connection, _ = self.acquire()
+        self.pool.release(connection)
+        self.now[0] = 5
+        self.acquire()
+        self.assertEqual(self.checked, [])  # idle for less than the interval
+        self.pool.release(connection)
+        connection.closed = True
+        self.now[0] = 20
+        replacement, reused = self.acquire()
+        self.assertEqual(self.checked, [connection])
+        self.assertIsNot(replacement, connection)
+        self.assertFalse(reused)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_old_and_broken_connections_are_closed(self):
+        connection, _ = self.acquire()
+        self.pool.release(connection, discard=True)
+        self.assertTrue(connection.closed)
+        connection, _ = self.acquire()
+        self.now[0] = 100
+        self.pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual((self.pool.size, self.pool.idle), (0, 0))
+
+    def test_surplus_idle_connections_are_reaped(self):
+        first, _ = self.acquire()
+        second, _ = self.acquire()
+        self.pool.release(first)
+        self.now[0] = 60
+        self.pool.release(second)
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+
+    def test_fill_opens_min_size(self):
+        self.pool.min_size = 2
+        self.pool.fill(self.connect)
+        self.assertEqual((self.pool.size, self.pool.idle), (2, 2))
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    """The pooling mixin on SQLite, standing in for the PostgreSQL and MySQL drivers."""
+
+    def setUp(self):
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_dict = {**connection.settings_dict, 'NAME': os.path.join(tmp.name, 'pool.sqlite3'),
+                         'POOL': {'MAX_SIZE': 2, 'HEALTH_CHECK_INTERVAL': 0}}
+        wrapper_class = type('PooledSQLiteWrapper', (db_pool.PooledDatabaseWrapperMixin, DatabaseWrapper), {})
+        self.wrapper = wrapper_class(settings_dict, alias='pool_test')
+        self.addCleanup(db_pool.close_pools, 'pool_test')
+
+    def test_close_returns_the_connection_for_reuse(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.close()
+        self.assertIsNone(self.wrapper.connection)
+        self.wrapper.ensure_connection()
+        self.assertIs(self.wrapper.connection, raw)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+        self.wrapper.close()
+
+    def test_connection_with_errors_is_not_reused(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.errors_occurred = True
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        self.assertIsNot(self.wrapper.connection, raw)
+        self.wrapper.close()
+
+
+@override_settings(DATABASE_REPLICAS=['replica0', 'replica1'], READ_YOUR_WRITES_WINDOW=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, view):
+        """Run ``view()`` as a request through the middleware and return what it returned."""
+        result = []
+        middleware = db_router.ReadYourWritesMiddleware(lambda request: result.append(view()) or HttpResponse())
+        middleware(self.factory.get('/'))
+        return result[0]
+
+    def test_reads_outside_a_request_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_a_request_reads_from_one_replica_until_it_writes(self):
+        def view():
+            reads = [self.router.db_for_read(None), self.router.db_for_read(None)]
+            self.router.db_for_write(None)
+            return reads + [self.router.db_for_read(None)]
+
+        first, second, after_write = self.handle(view)
+        self.assertIn(first, ('replica0', 'replica1'))
+        self.assertEqual(second, first)
+        self.assertEqual(after_write, 'default')
+
+    def test_client_reads_its_writes_within_the_window(self):
+        def write():
+            db_router.identify('alice')
+            self.router.db_for_write(None)
+
+        def read(client):
+            def view():
+                db_router.identify(client)
+                return self.router.db_for_read(None)
+            return view
+
+        self.handle(write)
+        self.assertEqual(self.handle(read('alice')), 'default')
+        self.assertNotEqual(self.handle(read('bob')), 'default')
+
+        with override_settings(READ_YOUR_WRITES_WINDOW=0):
+            cache.clear()
+            self.handle(write)
+            self.assertNotEqual(self.handle(read('alice')), 'default')
+
+    def test_use_primary(self):
+        def view():
+            db_router.use_primary()
+            return self.router.db_for_read(None)
+
+        self.assertEqual(self.handle(view), 'default')
+
+    def test_primary_reads(self):
+        def view():
+            with db_router.primary_reads():
+                inside = self.router.db_for_read(None)
+            return inside, self.router.db_for_read(None)
+
+        inside, after = self.handle(view)
+        self.assertEqual(inside, 'default')
+        self.assertNotEqual(after, 'default')
@@ -0,0 +1,156 @@
+"""Per-request timing breakdown reported as a ``Server-Timing`` header.
+
+``ServerTimingMiddleware`` samples requests at ``SERVER_TIMING_SAMPLE_RATE``.
+For a sampled request it collects:
+
+* ``db`` - time and count of queries on the request thread, via
+  ``connection.execute_wrapper``
+* one entry per ``timed(name)`` block, e.g. ``ipinfo``/``weatherapi`` for
+  upstream calls and ``hash`` for password hashing
+* ``render`` - response rendering (DRF serialization to bytes)
+* ``total`` - everything inside the middleware
+
+The breakdown is sent as a ``Server-Timing`` header and logged as one
+structured line on the ``hng1.timing`` logger. On requests that are not
+sampled, ``timed`` costs one context variable lookup.
+"""
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('hng1.timing')
+
+_current = contextvars.ContextVar('server_timing', default=None)
+
+
+class Timings:
+    """Accumulated ``(seconds, count)`` per metric name for one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, count = self.metrics.get(name, (0.0, 0))
+            self.metrics[name] = (total + seconds, count + 1)
+
+    def header(self):
+        parts = []
+        for name, (seconds, count) in self.metrics.items():
+            part = f'{name};dur={seconds * 1000:.1f}'
+            if name == 'db':
+                part += f';desc="{count} queries"'
+            parts.append(part)
+        return ', '.join(parts)
+
+    def as_log_fields(self):
+        fields = {}
+        for name, (seconds, count) in self.metrics.items():
+            fields[f'{name}_ms'] = round(seconds * 1000, 3)
+            if name == 'db':
+                fields['db_queries'] = count
+        return fields
+
+
+def current():
+    """Return the ``Timings`` of the request being sampled, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Add the time spent in the block to ``name`` if the current request is sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+class ServerTimingMiddleware:
+    """Report a sampled request's time breakdown; see the module docstring.
+
+    Place it first in ``MIDDLEWARE`` so ``total`` covers the whole stack.
+    Query time is only measured for sync views: async views run their
+    queries on other threads' connections.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = settings.SERVER_TIMING_SAMPLE_RATE
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.rate >= 1.0 or (self.rate > 0 and random.random() < self.rate)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_db_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, started)
+
+    def process_template_response(self, request, response):
+        # Runs just before a DRF/template response is rendered
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add('render', time.perf_counter() - started))
+        return response
+
+    def _finish(self, request, response, timings, started):
+        timings.add('total', time.perf_counter() - started)
+        response['Server-Timing'] = timings.header()
+        logger.info('request timing', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **timings.as_log_fields(),
+        })
+        return response
@@ -5,10 +5,12 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView,
 )
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/hello', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/', include('api.urls')),
     path('', include('user_management.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -0,0 +1,53 @@
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from api.cache import TTLCache, MISSING
+from hng1 import metrics
+from hng1.db import router
+
+# Verified tokens keyed by the SHA-256 of the raw token, kept until the token expires
+token_cache = TTLCache(maxsize=settings.JWT_TOKEN_CACHE_SIZE, ttl=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+# Authenticated users keyed by user id. Entries are dropped by the User
+# post_save/post_delete signals in this process; JWT_USER_CACHE_TTL bounds
+# how long other processes may serve a stale copy.
+user_cache = TTLCache(maxsize=settings.JWT_USER_CACHE_SIZE, ttl=settings.JWT_USER_CACHE_TTL)
+metrics.register_cache('jwt_token', token_cache)
+metrics.register_cache('jwt_user', user_cache)
+
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that skips re-verifying known tokens and re-loading known users."""
+
+    def get_validated_token(self, raw_token):
+        key = hashlib.sha256(raw_token).digest()
+        token = token_cache.get(key)
+        if token is not MISSING:
+            return token
+
+        token = super().get_validated_token(raw_token)
+        ttl = token.get('exp', 0) - time.time()
+        if ttl > 0:
+            token_cache.set(key, token, ttl=ttl)
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        # Before the user is loaded, so a client that just wrote reads it from the primary
+        router.identify(str(user_id))
+        user = user_cache.get(str(user_id))
+        if user is MISSING:
+            # Cached for every request of this process, so never a replica's copy
+            with router.primary_reads():
+                user = super().get_user(validated_token)
+            user_cache.set(str(user_id), user)
+        # Each request gets its own instance so views can't leak state between requests
+        return copy.copy(user)
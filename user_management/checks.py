@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_membership_version_cache(app_configs, **kwargs):
+    """Membership claims need a version cache every worker process shares.
+
+    With a process-local cache, a membership change bumps the version only in
+    the worker that handled it, and the others keep accepting tokens issued
+    before the change.
+    """
+    if not settings.JWT_MEMBERSHIP_CLAIMS:
+        return []
+    backend = settings.CACHES.get(settings.MEMBERSHIP_VERSION_CACHE, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'MEMBERSHIP_VERSION_CACHE ({settings.MEMBERSHIP_VERSION_CACHE!r}) uses {backend}, '
+            'which is not shared between worker processes.',
+            hint='Point it at a shared cache (CACHE_BACKEND / CACHE_LOCATION) or turn off JWT_MEMBERSHIP_CLAIMS.',
+            id='user_management.E001',
+        )]
+    return []
@@ -0,0 +1,205 @@
+"""Password hashing and verification off the request thread.
+
+PBKDF2 work runs on a bounded pool selected by ``PASSWORD_HASHING_POOL``:
+
+* ``'thread'`` - a thread pool; ``hashlib.pbkdf2_hmac`` releases the GIL, so
+  this already uses several cores.
+* ``'process'`` - a process pool, for CPU parallelism independent of the GIL.
+* ``'inline'`` - hash on the calling thread (the stock Django behaviour).
+
+Other hashers always run on the thread pool. ``make_password`` and
+``check_password`` mirror ``django.contrib.auth.hashers``, including
+rehashing through ``setter`` when the preferred hasher or its parameters
+changed; ``amake_password``/``acheck_password`` are awaitable variants.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from hng1 import timing
+
+_PBKDF2_DIGESTS = {'pbkdf2_sha256': 'sha256', 'pbkdf2_sha1': 'sha1'}
+
+_lock = threading.Lock()
+_executors = {}
+
+
+def _pbkdf2(password, salt, iterations, digest):
+    derived = hashlib.pbkdf2_hmac(digest, password.encode(), salt.encode(), iterations)
+    return base64.b64encode(derived).decode('ascii').strip()
+
+
+def pbkdf2_encode(password, salt, iterations, algorithm):
+    """Return a Django-format PBKDF2 hash. Runs in pool workers; no Django state needed."""
+    hash = _pbkdf2(password, salt, iterations, _PBKDF2_DIGESTS[algorithm])
+    return '%s$%d$%s$%s' % (algorithm, iterations, salt, hash)
+
+
+def pbkdf2_verify(password, encoded):
+    """Check ``password`` against a Django-format PBKDF2 hash in constant time.
+
+    A malformed hash does not verify.
+    """
+    try:
+        algorithm, iterations, salt, hash = encoded.split('$', 3)
+        candidate = _pbkdf2(password, salt, int(iterations), _PBKDF2_DIGESTS[algorithm])
+    except (ValueError, KeyError):
+        return False
+    return hmac.compare_digest(candidate.encode(), hash.encode())
+
+
+def _verify(hasher, password, encoded):
+    """``hasher.verify``, returning False for a malformed hash instead of raising."""
+    try:
+        return hasher.verify(password, encoded)
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def get_executor(kind=None):
+    """Return the shared executor for ``kind`` ('thread' or 'process'), creating it on first use."""
+    kind = kind or settings.PASSWORD_HASHING_POOL
+    executor = _executors.get(kind)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                workers = settings.PASSWORD_HASHING_WORKERS
+                if kind == 'process':
+                    # spawn: forking a multi-threaded server process is unsafe
+                    executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hashing')
+                _executors[kind] = executor
+    return executor
+
+
+def shutdown():
+    """Stop the pools; they are recreated on next use."""
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
+
+
+def _submit(fn, *args, pbkdf2=False):
+    """Run ``fn`` on the configured pool; return a concurrent future or the result inline."""
+    kind = settings.PASSWORD_HASHING_POOL
+    if kind == 'inline':
+        return fn(*args)
+    if kind == 'process' and not pbkdf2:
+        kind = 'thread'
+    return get_executor(kind).submit(fn, *args)
+
+
+def _result(value):
+    return value.result() if isinstance(value, Future) else value
+
+
+def _encode_job(password):
+    hasher = hashers.get_hasher('default')
+    if hasher.algorithm in _PBKDF2_DIGESTS:
+        return _submit(pbkdf2_encode, password, hasher.salt(), hasher.iterations, hasher.algorithm, pbkdf2=True)
+    return _submit(hasher.encode, password, hasher.salt())
+
+
+def make_password(password):
+    """Hash ``password`` with the preferred hasher on the hashing pool."""
+    if password is None:
+        return hashers.make_password(None)
+    if not isinstance(password, (bytes, str)):
+        raise TypeError('Password must be a string or bytes, got %s.' % type(password).__qualname__)
+    if isinstance(password, bytes):
+        password = password.decode()
+    with timing.timed('hash'):
+        return _result(_encode_job(password))
+
+
+def _verify_job(password, encoded):
+    """Return ``(future_or_result, hasher, preferred)`` for a verification, or None if unusable."""
+    if password is None or not hashers.is_password_usable(encoded):
+        return None
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return None
+    if hasher.algorithm in _PBKDF2_DIGESTS:
+        job = _submit(pbkdf2_verify, password, encoded, pbkdf2=True)
+    else:
+        job = _submit(_verify, hasher, password, encoded)
+    return job, hasher, hashers.get_hasher('default')
+
+
+def _finish_check(password, encoded, is_correct, hasher, preferred, setter):
+    # must_update() parses the hash, so only ask once it has verified
+    if setter and is_correct and (hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)):
+        setter(password)
+    return is_correct
+
+
+def check_password(password, encoded, setter=None):
+    """Verify ``password`` on the hashing pool; call ``setter`` to rehash if needed."""
+    with timing.timed('hash'):
+        verification = _verify_job(password, encoded)
+        if verification is None:
+            return False
+        job, hasher, preferred = verification
+        is_correct = _result(job)
+    return _finish_check(password, encoded, is_correct, hasher, preferred, setter)
+
+
+def make_passwords(passwords, kind='process', chunksize=16):
+    """Hash many passwords on the ``kind`` pool, preserving order.
+
+    Used for bulk work where hashing dominates; ``None`` entries get an
+    unusable password.
+    """
+    hasher = hashers.get_hasher('default')
+    passwords = list(passwords)
+    if hasher.algorithm not in _PBKDF2_DIGESTS or kind == 'inline':
+        return [make_password(password) for password in passwords]
+    todo = [i for i, password in enumerate(passwords) if password is not None]
+    encoded = get_executor(kind).map(
+        pbkdf2_encode,
+        [passwords[i] for i in todo],
+        [hasher.salt() for _ in todo],
+        [hasher.iterations] * len(todo),
+        [hasher.algorithm] * len(todo),
+        chunksize=chunksize,
+    )
+    result = [None] * len(passwords)
+    for i, value in zip(todo, encoded):
+        result[i] = value
+    return [value if value is not None else hashers.make_password(None) for value in result]
+
+
+async def amake_password(password):
+    if password is None or isinstance(password, bytes):
+        return make_password(password)
+    with timing.timed('hash'):
+        job = _encode_job(password)
+        return await asyncio.wrap_future(job) if isinstance(job, Future) else job
+
+
+async def acheck_password(password, encoded, setter=None):
+    """Awaitable ``check_password``; ``setter`` may be a plain or async callable."""
+    with timing.timed('hash'):
+        verification = _verify_job(password, encoded)
+        if verification is None:
+            return False
+        job, hasher, preferred = verification
+        is_correct = await asyncio.wrap_future(job) if isinstance(job, Future) else job
+    updated = []
+    is_correct = _finish_check(password, encoded, is_correct, hasher, preferred, updated.append)
+    if updated and setter:
+        result = setter(password)
+        if asyncio.iscoroutine(result):
+            await result
+    return is_correct
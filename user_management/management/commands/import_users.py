@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+import time
+import uuid
+
+from django.core import exceptions
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from user_management import hashing
+from user_management.models import Organization, User
+from user_management.serializers import UserSerializer
+
+FIELDS = ('firstName', 'lastName', 'email', 'password', 'phone')
+
+
+def read_rows(path, fmt):
+    """Yield one dict per user from a CSV or NDJSON file, streaming."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def clean_row(row):
+    """Validate a row with the registration rules; return the cleaned data or raise."""
+    if not isinstance(row, dict):
+        raise exceptions.ValidationError(f'expected an object, got {type(row).__name__}')
+    data = {field: (str(row.get(field) or '')).strip() for field in FIELDS}
+    data['phone'] = data['phone'] or None
+    data['email'] = User.objects.normalize_email(data['email'])
+    UserSerializer().validate(data)
+    for field in ('firstName', 'lastName', 'email', 'phone'):
+        if data[field]:
+            User._meta.get_field(field).run_validators(data[field])
+    return data
+
+
+class Command(BaseCommand):
+    help = ('Import users from a CSV or NDJSON file in batches, giving each the default '
+            '"<firstName>\'s Organisation". Re-run with --resume to continue after a failure.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pool', choices=['process', 'thread', 'inline'], default='process',
+                            help='where to hash passwords (default: process pool)')
+        parser.add_argument('--resume', action='store_true',
+                            help='skip the rows recorded in the checkpoint file')
+        parser.add_argument('--checkpoint', help='checkpoint file (default: <path>.checkpoint)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        skip = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        self.pool = options['pool']
+        self.imported = self.skipped = 0
+
+        started = time.monotonic()
+        processed = 0
+        committed = skip
+        batch = []
+        try:
+            for row in read_rows(path, fmt):
+                processed += 1
+                if processed <= skip:
+                    continue
+                try:
+                    batch.append(clean_row(row))
+                except (serializers.ValidationError, exceptions.ValidationError) as e:
+                    self.skip_row(processed, e)
+                if len(batch) >= options['batch_size']:
+                    self.import_batch(batch)
+                    batch = []
+                    self.write_checkpoint(checkpoint, processed)
+                    committed = processed
+                    self.report(processed, started)
+            if batch:
+                self.import_batch(batch)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'row {processed}: {e}. Re-run with --resume to continue.')
+        except DatabaseError as e:
+            raise CommandError(
+                f'batch of rows {committed + 1}-{processed} failed: {e}. Rows up to {committed} are '
+                f'imported; re-run with --resume to continue from row {committed + 1}.'
+            )
+
+        if os.path.exists(checkpoint):
+            os.unlink(checkpoint)
+        self.report(processed, started)
+        self.stdout.write(self.style.SUCCESS(f'Imported {self.imported} users, skipped {self.skipped} rows'))
+
+    def import_batch(self, rows):
+        # Drop rows whose email already exists or repeats within the batch
+        existing = set(User.objects.filter(email__in=[row['email'] for row in rows]).values_list('email', flat=True))
+        unique = {}
+        for row in rows:
+            if row['email'] in existing or row['email'] in unique:
+                self.skip_row(None, f"duplicate email {row['email']}")
+            else:
+                unique[row['email']] = row
+        rows = list(unique.values())
+        if not rows:
+            return
+
+        passwords = hashing.make_passwords([row['password'] or None for row in rows], kind=self.pool)
+        users = []
+        orgs = []
+        for row, password in zip(rows, passwords):
+            users.append(User(userId=uuid.uuid4(), email=row['email'], firstName=row['firstName'],
+                              lastName=row['lastName'], phone=row['phone'], password=password))
+            orgs.append(Organization(orgId=uuid.uuid4(), name=f"{row['firstName']}'s Organisation"))
+        through = Organization.users.through
+        memberships = [through(organization_id=org.orgId, user_id=user.userId) for user, org in zip(users, orgs)]
+
+        # New users hold no tokens or cached state, so no m2m signals are needed
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            Organization.objects.bulk_create(orgs)
+            through.objects.bulk_create(memberships)
+        self.imported += len(users)
+
+    def skip_row(self, row_number, error):
+        self.skipped += 1
+        where = f'row {row_number}' if row_number else 'row'
+        self.stderr.write(f'Skipped {where}: {error}')
+
+    def report(self, processed, started):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f'{processed} rows read, {self.imported} imported ({rate:.0f} rows/s)')
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, processed):
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(processed))
+        os.replace(tmp, checkpoint)
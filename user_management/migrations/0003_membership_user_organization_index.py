@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+# The auto-created membership table already has a unique index on
+# (organization_id, user_id), which serves organisation -> users lookups.
+# User -> organisations lookups only had the single-column user_id index;
+# this adds (user_id, organization_id) so they are answered from the index
+# alone, already in organisation order.
+INDEX = models.Index(fields=['user', 'organization'], name='um_membership_user_org_idx')
+
+
+def membership_model(apps):
+    return apps.get_model('user_management', 'Organization')._meta.get_field('users').remote_field.through
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(membership_model(apps), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(membership_model(apps), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_management', '0002_user_membership_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -1,28 +1,55 @@
-from django.db import models
+from django.db import models, router
+from django.db.models.signals import m2m_changed
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 import uuid
 from django.utils import timezone
+from . import hashing
 
 class CustomUserManager(BaseUserManager):
-    def create_user(self, email, firstName, lastName, password=None, phone=None):
+    def create_user(self, email, firstName, lastName, password=None, phone=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
 
         email = self.normalize_email(email)
-        user = self.model(email=email, firstName=firstName, lastName=lastName, phone=phone)
+        user = self.model(email=email, firstName=firstName, lastName=lastName, phone=phone, **extra_fields)
         user.set_password(password)
         user.userId = uuid.uuid4()
         user.date_joined = timezone.now()  # Ensure date_joined is set
-        user.save(using=self._db)
+        # The primary key is generated here, so this is always a single INSERT
+        user.save(using=self._db, force_insert=True)
         return user
 
     def create_superuser(self, email, firstName, lastName, password, phone=None):
-        user = self.create_user(email=email, firstName=firstName, lastName=lastName, password=password, phone=phone)
-        user.is_admin = True
-        user.save(using=self._db)
-        return user
+        return self.create_user(email=email, firstName=firstName, lastName=lastName, password=password,
+                                phone=phone, is_admin=True)
+
+class VersionedModel(models.Model):
+    """Adds a ``version`` counter and ``updated_at`` timestamp, both maintained by ``save``.
+
+    They back the ETag/Last-Modified headers of the detail views. Bulk
+    ``QuerySet.update`` calls bypass ``save`` and must bump them explicitly.
+    """
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+
+    @property
+    def etag(self):
+        # The timestamp keeps tags distinct if two concurrent saves compute the same version
+        return f'"{self.version}.{self.updated_at.timestamp():.6f}"'
 
-class User(AbstractBaseUser):
+
+class User(AbstractBaseUser, VersionedModel):
     userId = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     firstName = models.CharField(max_length=255, null=False)
     lastName = models.CharField(max_length=255, null=False)
@@ -32,6 +59,9 @@ class User(AbstractBaseUser):
     is_admin = models.BooleanField(default=False)
     last_login = models.DateTimeField(default=timezone.now)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Bumped whenever the user's organisation memberships change, so tokens
+    # carrying a membership claim can tell they are stale
+    membership_version = models.PositiveIntegerField(default=0)
 
     objects = CustomUserManager()
 
@@ -41,11 +71,58 @@ class User(AbstractBaseUser):
     def __str__(self):
         return self.email
 
-class Organization(models.Model):
+    def set_password(self, raw_password):
+        # Hash on the bounded hashing pool instead of the request thread
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """Verify on the hashing pool, upgrading the stored hash if its parameters are outdated."""
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
+class Organization(VersionedModel):
     orgId = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, null=False)
     description = models.TextField(blank=True, null=True)
     users = models.ManyToManyField(User, related_name='organizations')
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def add_members(self, user_ids, batch_size=1000):
+        """Add many users at once; return ``(added, already_members, not_found)`` sets of UUIDs.
+
+        Users are resolved with ``in_bulk``, existing memberships are looked
+        up and membership rows inserted ``batch_size`` ids at a time (keeping
+        each query under the database's bound-parameter limit), ignoring
+        conflicts with concurrent adds. The
+        ``m2m_changed`` signals are sent as ``users.add()`` would. Run inside
+        a transaction to make the whole add atomic.
+        """
+        user_ids = set(user_ids)
+        found = set(User.objects.only('userId').in_bulk(user_ids))
+        through = Organization.users.through
+        found_ids = list(found)
+        already_members = set()
+        for start in range(0, len(found_ids), batch_size):
+            already_members.update(through.objects.filter(
+                organization_id=self.pk, user_id__in=found_ids[start:start + batch_size]
+            ).values_list('user_id', flat=True))
+        added = found - already_members
+        if added:
+            using = router.db_for_write(through, instance=self)
+            signal_kwargs = dict(sender=through, instance=self, reverse=False, model=User, pk_set=added, using=using)
+            m2m_changed.send(action='pre_add', **signal_kwargs)
+            through.objects.using(using).bulk_create(
+                [through(organization_id=self.pk, user_id=user_id) for user_id in added],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            m2m_changed.send(action='post_add', **signal_kwargs)
+        return added, already_members, user_ids - found
\ No newline at end of file
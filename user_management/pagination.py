@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class OrganizationCursorPagination(CursorPagination):
+    """Keyset pagination over the organisation primary key.
+
+    Each page is a ``WHERE orgId > <cursor> ORDER BY orgId LIMIT n`` seek, so
+    deep pages cost the same as the first; cursors are opaque tokens.
+    """
+
+    ordering = 'orgId'
+    page_size = settings.ORGANIZATION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ORGANIZATION_MAX_PAGE_SIZE
@@ -0,0 +1,56 @@
+import uuid
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .models import Organization
+from .tokens import current_membership_version
+
+
+class IsOrganizationMember(BasePermission):
+    """Allow access only to members of the organisation named by the ``pk`` URL kwarg.
+
+    Only enforced with JWT_MEMBERSHIP_CLAIMS on. A token whose 'orgs' claim
+    was issued at the user's current membership version answers the
+    question without a membership query. Otherwise the membership table is
+    checked. Malformed and unknown organisation ids are let through, so the
+    view answers them with its usual 400/404.
+    """
+
+    message = 'You are not a member of this organisation.'
+
+    def has_permission(self, request, view):
+        if not settings.JWT_MEMBERSHIP_CLAIMS:
+            return True
+        try:
+            org_id = str(uuid.UUID(str(view.kwargs['pk'])))
+        except (KeyError, ValueError):
+            return True
+
+        claims = request.auth
+        if (claims is not None and 'orgs' in claims
+                and claims.get('mv') == current_membership_version(request.user.pk)):
+            is_member = org_id in claims['orgs']
+        else:
+            is_member = Organization.users.through.objects.filter(
+                organization_id=org_id, user_id=request.user.pk
+            ).exists()
+        return is_member or not Organization.objects.filter(pk=org_id).exists()
+
+
+class IsAdmin(BasePermission):
+    """Allow access only to users with ``is_admin`` set."""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.is_admin)
+
+
+class IsSelfOrAdmin(BasePermission):
+    """Allow users to access only their own ``pk`` URL kwarg; admins may access any."""
+
+    def has_permission(self, request, view):
+        try:
+            user_id = uuid.UUID(str(view.kwargs['pk']))
+        except (KeyError, ValueError):
+            return False
+        return user_id == request.user.pk or request.user.is_admin
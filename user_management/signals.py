@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import Organization, User
+from .tokens import cache_membership_versions
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=Organization.users.through)
+def bump_membership_version(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark membership claims in already-issued tokens as stale for the affected users."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == 'pre_clear':
+        user_ids = list(instance.users.values_list('pk', flat=True))
+    else:
+        user_ids = list(pk_set)
+    if not user_ids:
+        return
+    # Batched like add_members, which can add thousands of users at once
+    batch_size = settings.MEMBERSHIP_BATCH_SIZE
+    for start in range(0, len(user_ids), batch_size):
+        users = User.objects.filter(pk__in=user_ids[start:start + batch_size])
+        users.update(membership_version=F('membership_version') + 1)
+        # Other workers check tokens against the shared cache, not their cached users
+        cache_membership_versions(dict(users.values_list('pk', 'membership_version')))
+    for user_id in user_ids:
+        invalidate_user(user_id)
@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user_management import authentication
+from user_management.models import User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        authentication.token_cache.clear()
+        authentication.user_cache.clear()
+        self.user = User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = f'/api/users/{self.user.userId}/'
+
+    def test_repeat_requests_skip_user_query(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_repeat_requests_skip_token_verification(self):
+        self.client.get(self.url)
+        with patch('rest_framework_simplejwt.authentication.JWTAuthentication.get_validated_token') as verify:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        verify.assert_not_called()
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+# 'replica0' has no connection, so any read routed to it fails: a replica
+# that has not caught up with anything. Not a TestCase, whose transaction
+# would keep every read on the primary.
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, DATABASE_REPLICAS=['replica0'],
+                   DATABASE_ROUTERS=['hng1.db.router.ReplicaRouter'])
+class ReadYourWritesLoginTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_login_right_after_registration_reads_the_primary(self):
+        client = APIClient()
+        response = client.post('/auth/register/', {
+            'email': 'ada@example.com', 'password': 'pw', 'firstName': 'Ada', 'lastName': 'Obi',
+        })
+        self.assertEqual(response.status_code, 201)
+        response = client.post('/auth/login/', {'email': 'ada@example.com', 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], 'Login successful')
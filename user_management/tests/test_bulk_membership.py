@@ -0,0 +1,73 @@
+import uuid
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user_management.models import Organization, User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class BulkMembershipTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', firstName='O', lastName='W', password='pw')
+        self.org = Organization.objects.create(name='Acme')
+        self.org.users.add(self.owner)
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', firstName='U', lastName=str(i), password='pw')
+            for i in range(5)
+        ]
+        self.org.users.add(self.users[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/organisations/{self.org.orgId}/users/'
+
+    def test_adds_many_users_with_per_id_results(self):
+        missing = str(uuid.uuid4())
+        ids = [str(u.userId) for u in self.users] + [missing, 'not-a-uuid']
+        # Constant in the number of ids below MEMBERSHIP_BATCH_SIZE: savepoint,
+        # org, users, existing members, insert, version bump, version read, release
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, {'userIds': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual((data['added'], data['alreadyMember'], data['notFound']), (4, 1, 2))
+        results = {r['userId']: r['result'] for r in data['results']}
+        self.assertEqual(results[str(self.users[0].userId)], 'already_member')
+        self.assertEqual(results[str(self.users[1].userId)], 'added')
+        self.assertEqual(results[missing], 'not_found')
+        self.assertEqual(results['not-a-uuid'], 'not_found')
+        self.assertEqual(self.org.users.count(), 6)
+
+    def test_membership_version_is_bumped_for_added_users(self):
+        before = User.objects.get(pk=self.users[1].pk).membership_version
+        self.client.post(self.url, {'userIds': [str(self.users[1].userId)]}, format='json')
+        self.assertEqual(User.objects.get(pk=self.users[1].pk).membership_version, before + 1)
+
+    @override_settings(MEMBERSHIP_BATCH_SIZE=2)
+    def test_lookups_are_batched(self):
+        ids = {u.userId for u in self.users}
+        # Users, then per batch of 2: 3 member checks (5 users), 2 inserts and
+        # 2 version bumps + reads (4 added)
+        with self.assertNumQueries(1 + 3 + 2 + 2 * 2):
+            added, already_members, not_found = self.org.add_members(ids, batch_size=2)
+        self.assertEqual(already_members, {self.users[0].userId})
+        self.assertEqual(added, ids - already_members)
+        self.assertEqual(not_found, set())
+        self.assertEqual(self.org.users.count(), 6)
+
+    def test_single_user_requests_still_work(self):
+        response = self.client.post(self.url, {'userId': str(self.users[2].userId)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.org.users.filter(pk=self.users[2].pk).exists())
+
+    def test_empty_list_is_rejected(self):
+        response = self.client.post(self.url, {'userIds': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_org_id_is_rejected_like_single_adds(self):
+        url = '/api/organisations/not-a-uuid/users/'
+        single = self.client.post(url, {'userId': str(self.users[1].userId)}, format='json')
+        response = self.client.post(url, {'userIds': [str(self.users[1].userId)]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, single.data)
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user_management.models import Organization, User
+from user_management.serializers import OrganizationSerializer
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+        self.org = Organization.objects.create(name='Org')
+        self.org.users.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/organisations/{self.org.pk}/'
+
+    def test_response_carries_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], self.org.etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_matching_etag_short_circuits_serialization(self):
+        etag = self.client.get(self.url)['ETag']
+        with patch.object(OrganizationSerializer, 'to_representation') as serialize:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        serialize.assert_not_called()
+
+    def test_save_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.org.name = 'Renamed'
+        self.org.save()
+        self.assertEqual(self.org.version, 2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Renamed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_update_fields_save_bumps_version(self):
+        self.user.firstName = 'Z'
+        self.user.save(update_fields=['firstName'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.version, 2)
+
+    def test_user_detail(self):
+        url = f'/api/users/{self.user.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user_management.models import Organization, User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, EXPORT_CHUNK_SIZE=2, EXPORT_BUFFER_BYTES=64)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='root@example.com', firstName='Root', lastName='T', password='pw')
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', firstName=f'U{i}', lastName='L', password='pw')
+            for i in range(4)
+        ]
+        self.org = Organization.objects.create(name='Org')
+        self.org.users.add(*self.users[:3])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_users_ndjson(self):
+        rows = [json.loads(line) for line in self.get('/api/exports/users.ndjson').splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['email'] for row in rows}, {u.email for u in self.users} | {self.admin.email})
+        self.assertNotIn('password', rows[0])
+
+    def test_memberships_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.get('/api/exports/memberships.csv'))))
+        self.assertEqual({row['userId'] for row in rows}, {str(u.pk) for u in self.users[:3]})
+        self.assertEqual({row['orgId'] for row in rows}, {str(self.org.pk)})
+
+    def test_organisations_csv_nulls_are_empty(self):
+        rows = list(csv.DictReader(io.StringIO(self.get('/api/exports/organisations.csv'))))
+        self.assertEqual(rows, [{'orgId': str(self.org.pk), 'name': 'Org', 'description': ''}])
+
+    def test_non_admins_are_forbidden(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get('/api/exports/users.csv').status_code, 403)
+
+    def test_unknown_dataset(self):
+        self.assertEqual(self.client.get('/api/exports/passwords.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/users.xml').status_code, 404)
@@ -0,0 +1,62 @@
+from django.contrib.auth import hashers as django_hashers
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from user_management import hashing
+from user_management.models import User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class HashingPoolTests(SimpleTestCase):
+    def tearDown(self):
+        hashing.shutdown()
+
+    def assert_round_trip(self):
+        encoded = hashing.make_password('s3cret!')
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(hashing.check_password('s3cret!', encoded))
+        self.assertFalse(hashing.check_password('wrong', encoded))
+        # Interoperates with Django's own implementation
+        self.assertTrue(django_hashers.check_password('s3cret!', encoded))
+
+    def test_thread_pool(self):
+        self.assert_round_trip()
+
+    @override_settings(PASSWORD_HASHING_POOL='process', PASSWORD_HASHING_WORKERS=1)
+    def test_process_pool(self):
+        self.assert_round_trip()
+
+    @override_settings(PASSWORD_HASHING_POOL='inline')
+    def test_inline(self):
+        self.assert_round_trip()
+
+    def test_unusable_passwords(self):
+        self.assertFalse(hashing.check_password('x', django_hashers.make_password(None)))
+        self.assertFalse(hashing.check_password(None, hashing.make_password('x')))
+        self.assertFalse(hashing.check_password('x', 'nonsense'))
+
+    def test_malformed_hashes_do_not_verify(self):
+        for encoded in ('pbkdf2_sha256$1000', 'pbkdf2_sha256$many$salt$hash', 'pbkdf2_sha256$0$salt$hash',
+                        'pbkdf2_sha1$$$', 'bcrypt_sha256$nonsense', 'argon2$nonsense'):
+            with self.subTest(encoded=encoded):
+                self.assertFalse(hashing.check_password('x', encoded, setter=self.fail))
+                self.assertFalse(hashing.pbkdf2_verify('x', encoded))
+
+    async def test_async_wrappers(self):
+        encoded = await hashing.amake_password('s3cret!')
+        self.assertTrue(await hashing.acheck_password('s3cret!', encoded))
+        self.assertFalse(await hashing.acheck_password('wrong', encoded))
+
+
+class RehashOnLoginTests(TestCase):
+    def test_hash_is_upgraded_when_iterations_change(self):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            response = self.client.post('/auth/login/', {'email': 'a@example.com', 'password': 'pw'})
+
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password('pw'))
@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from user_management.management.commands import import_users
+from user_management.models import Organization, User
+
+CSV = """firstName,lastName,email,password,phone
+Ada,Obi,ada@example.com,pw1,0810
+Bola,Ade,bola@example.com,pw2,
+,Missing,nofirst@example.com,pw3,
+Ada,Again,ada@example.com,pw4,
+Chi,Eze,chi@example.com,pw5,0803
+"""
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        call_command('import_users', path, '--batch-size', '2', *args, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_imports_valid_rows_with_default_organisations(self):
+        self.run_import(self.write('users.csv', CSV), '--pool', 'process')
+
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)),
+            {'ada@example.com', 'bola@example.com', 'chi@example.com'},
+        )
+        ada = User.objects.get(email='ada@example.com')
+        self.assertTrue(ada.check_password('pw1'))
+        self.assertEqual(list(ada.organizations.values_list('name', flat=True)), ["Ada's Organisation"])
+        self.assertEqual(Organization.objects.count(), 3)
+
+    def test_ndjson(self):
+        lines = [{'firstName': 'Ada', 'lastName': 'Obi', 'email': 'ada@example.com', 'password': 'pw'}]
+        self.run_import(self.write('users.ndjson', '\n'.join(json.dumps(line) for line in lines)), '--pool', 'thread')
+        self.assertTrue(User.objects.get(email='ada@example.com').check_password('pw'))
+
+    def test_resume_skips_checkpointed_rows(self):
+        path = self.write('users.csv', CSV)
+        self.write('users.csv.checkpoint', '2')
+        self.run_import(path, '--resume', '--pool', 'thread')
+        self.assertEqual(set(User.objects.values_list('email', flat=True)), {'ada@example.com', 'chi@example.com'})
+        self.assertEqual(User.objects.get(email='ada@example.com').lastName, 'Again')
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_ndjson_non_objects_are_invalid_rows(self):
+        lines = ['[1, 2]', '3', '"ada@example.com"',
+                 json.dumps({'firstName': 'Ada', 'lastName': 'Obi', 'email': 'ada@example.com', 'password': 'pw'})]
+        stderr = io.StringIO()
+        call_command('import_users', self.write('users.ndjson', '\n'.join(lines)), '--pool', 'inline',
+                     stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(stderr.getvalue().count('Skipped row'), 3)
+        self.assertEqual(list(User.objects.values_list('email', flat=True)), ['ada@example.com'])
+
+    def test_failed_batch_names_the_checkpoint(self):
+        path = self.write('users.csv', CSV)
+        with patch.object(import_users.Command, 'import_batch', side_effect=[None, IntegrityError('duplicate key')]), \
+                self.assertRaisesMessage(CommandError, 'rows 3-5 failed: duplicate key') as raised:
+            self.run_import(path, '--pool', 'inline')
+        self.assertIn('continue from row 3', str(raised.exception))
+        with open(path + '.checkpoint') as f:
+            self.assertEqual(f.read(), '2')
@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user_management.models import Organization, User
+from user_management.pagination import OrganizationCursorPagination
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class OrganizationListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+        other = User.objects.create_user(email='b@example.com', firstName='B', lastName='C', password='pw')
+        self.own = {str(Organization.objects.create(name=f'Own {i}').orgId) for i in range(7)}
+        for org in Organization.objects.filter(orgId__in=self.own):
+            org.users.add(self.user)
+        for i in range(3):
+            Organization.objects.create(name=f'Other {i}').users.add(other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_only_own_organisations(self):
+        seen = []
+        url = '/api/organisations/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(org['orgId'] for org in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, sorted(self.own))
+
+    def test_deep_pages_cost_one_query(self):
+        first = self.client.get('/api/organisations/?page_size=2')
+        second = self.client.get(first.data['next'])
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+        with self.assertNumQueries(1):
+            self.client.get(second.data['next'])
+
+    def test_page_size_is_capped(self):
+        with patch.object(OrganizationCursorPagination, 'max_page_size', 2):
+            response = self.client.get('/api/organisations/?page_size=100')
+        self.assertEqual(len(response.data['results']), 2)
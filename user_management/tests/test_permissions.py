@@ -0,0 +1,113 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user_management import authentication, checks, permissions
+from user_management.models import Organization, User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, JWT_MEMBERSHIP_CLAIMS=True)
+class MembershipClaimTests(TestCase):
+    def setUp(self):
+        authentication.token_cache.clear()
+        authentication.user_cache.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.client.post('/auth/register/', {
+            'email': 'ada@example.com', 'password': 'pw', 'firstName': 'Ada', 'lastName': 'Obi',
+        })
+        response = self.client.post('/auth/login/', {'email': 'ada@example.com', 'password': 'pw'})
+        self.token = AccessToken(response.data['data']['accessToken'])
+        self.user = User.objects.get(email='ada@example.com')
+        self.org = self.user.organizations.get()
+        self.other_org = Organization.objects.create(name='Other')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_token_carries_memberships(self):
+        self.assertEqual(self.token['orgs'], [str(self.org.orgId)])
+        self.assertEqual(self.token['mv'], self.user.membership_version)
+
+    def test_member_check_needs_no_membership_query(self):
+        self.client.get(f'/api/organisations/{self.org.orgId}/')  # warm the user cache
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/organisations/{self.org.orgId}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_member_is_forbidden(self):
+        response = self.client.get(f'/api/organisations/{self.other_org.orgId}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_membership_change_makes_claim_stale(self):
+        self.other_org.users.add(self.user)
+        response = self.client.get(f'/api/organisations/{self.other_org.orgId}/')
+        self.assertEqual(response.status_code, 200)
+
+        self.org.users.remove(self.user)
+        response = self.client.get(f'/api/organisations/{self.org.orgId}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_change_made_by_another_worker_is_seen(self):
+        self.client.get(f'/api/organisations/{self.org.orgId}/')
+        stale_user = authentication.user_cache.get(str(self.user.pk))
+        self.org.users.remove(self.user)
+        # Another worker still holds the user as it was before the change
+        authentication.user_cache.set(str(self.user.pk), stale_user)
+        response = self.client.get(f'/api/organisations/{self.org.orgId}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_and_malformed_ids_keep_their_responses(self):
+        self.assertEqual(self.client.get('/api/organisations/not-a-uuid/').status_code, 404)
+        missing = '00000000-0000-0000-0000-000000000000'
+        self.assertEqual(self.client.get(f'/api/organisations/{missing}/').status_code, 404)
+        response = self.client.post('/api/organisations/not-a-uuid/users/', {'userId': str(self.user.pk)})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(JWT_MEMBERSHIP_CLAIMS=False)
+    def test_not_enforced_when_claims_are_off(self):
+        self.client.get(f'/api/organisations/{self.org.orgId}/')  # warm the user cache
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/organisations/{self.other_org.orgId}/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(JWT_MEMBERSHIP_CLAIM_MAX_ORGS=0)
+    def test_too_many_orgs_falls_back_to_database(self):
+        response = self.client.post('/auth/login/', {'email': 'ada@example.com', 'password': 'pw'})
+        token = AccessToken(response.data['data']['accessToken'])
+        self.assertNotIn('orgs', token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(f'/api/organisations/{self.org.orgId}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_write_view_pins_primary_before_permission_check(self):
+        calls = []
+        has_permission = permissions.IsOrganizationMember.has_permission
+
+        def check(*args):
+            calls.append('permission')
+            return has_permission(*args)
+
+        with patch('user_management.views.router.use_primary', side_effect=lambda: calls.append('primary')), \
+                patch.object(permissions.IsOrganizationMember, 'has_permission', autospec=True, side_effect=check):
+            response = self.client.post(f'/api/organisations/{self.org.orgId}/users/', {'userId': str(self.user.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls[:2], ['primary', 'permission'])
+
+
+class MembershipVersionCacheCheckTests(SimpleTestCase):
+    SHARED = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+              'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+
+    def check(self, **overrides):
+        with override_settings(CACHES=self.SHARED, **overrides):
+            return [error.id for error in checks.check_membership_version_cache(None)]
+
+    def test_process_local_cache_is_refused_when_claims_are_on(self):
+        self.assertEqual(self.check(JWT_MEMBERSHIP_CLAIMS=True, MEMBERSHIP_VERSION_CACHE='default'),
+                         ['user_management.E001'])
+
+    def test_shared_cache_or_claims_off_pass(self):
+        self.assertEqual(self.check(JWT_MEMBERSHIP_CLAIMS=True, MEMBERSHIP_VERSION_CACHE='shared'), [])
+        self.assertEqual(self.check(JWT_MEMBERSHIP_CLAIMS=False, MEMBERSHIP_VERSION_CACHE='default'), [])
@@ -0,0 +1,51 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user_management.models import Organization, User
+
+# Statements allowed per request. Raise these deliberately, not to make a
+# test pass: every extra round trip costs throughput against a remote database.
+REGISTER_QUERY_BUDGET = 6  # unique-email check, savepoint, 3 INSERTs, release
+LOGIN_QUERY_BUDGET = 2  # user lookup, membership claim
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, JWT_MEMBERSHIP_CLAIMS=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_register(self):
+        with self.assertNumQueries(REGISTER_QUERY_BUDGET):
+            response = self.client.post('/auth/register/', {
+                'firstName': 'Ada', 'lastName': 'Obi', 'email': 'ada@example.com', 'password': 'pw',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        user = User.objects.get(email='ada@example.com')
+        self.assertTrue(user.check_password('pw'))
+        org = Organization.objects.get(users=user)
+        self.assertEqual(org.name, "Ada's Organisation")
+        token = AccessToken(response.data['data']['accessToken'])
+        self.assertEqual(token['orgs'], [str(org.orgId)])
+
+    def test_register_is_atomic(self):
+        original = Organization.objects.create
+        Organization.objects.create = lambda **kwargs: (_ for _ in ()).throw(RuntimeError('boom'))
+        self.addCleanup(setattr, Organization.objects, 'create', original)
+        response = self.client.post('/auth/register/', {
+            'firstName': 'Ada', 'lastName': 'Obi', 'email': 'ada@example.com', 'password': 'pw',
+        }, format='json')
+        self.assertEqual(response.data['message'], 'Registration unsuccessful')
+        self.assertFalse(User.objects.filter(email='ada@example.com').exists())
+
+    def test_login(self):
+        User.objects.create_user(email='ada@example.com', firstName='Ada', lastName='Obi', password='pw')
+        with self.assertNumQueries(LOGIN_QUERY_BUDGET):
+            response = self.client.post('/auth/login/', {'email': 'ada@example.com', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_superuser_saves_once(self):
+        with self.assertNumQueries(1):
+            user = User.objects.create_superuser(email='root@example.com', firstName='R', lastName='T', password='pw')
+        self.assertTrue(User.objects.get(pk=user.pk).is_admin)
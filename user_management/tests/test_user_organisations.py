@@ -0,0 +1,41 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from user_management.models import Organization, User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class UserOrganisationsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='a@example.com', firstName='A', lastName='B', password='pw')
+        self.other = User.objects.create_user(email='b@example.com', firstName='B', lastName='C', password='pw')
+        self.own = sorted(str(Organization.objects.create(name=f'Own {i}').orgId) for i in range(5))
+        for org_id in self.own:
+            Organization.objects.get(pk=org_id).users.add(self.user)
+        Organization.objects.create(name='Other').users.add(self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/users/{self.user.pk}/organisations/'
+
+    def test_lists_own_organisations_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([org['orgId'] for org in response.data['results']], self.own)
+
+    def test_other_users_are_forbidden(self):
+        self.assertEqual(self.client.get(f'/api/users/{self.other.pk}/organisations/').status_code, 403)
+        self.assertEqual(self.client.get('/api/users/not-a-uuid/organisations/').status_code, 403)
+
+    def test_admins_may_list_any_user(self):
+        admin = User.objects.create_superuser(email='root@example.com', firstName='R', lastName='T', password='pw')
+        self.client.force_authenticate(admin)
+        response = self.client.get(f'/api/users/{self.other.pk}/organisations/')
+        self.assertEqual([org['name'] for org in response.data['results']], ['Other'])
+
+    def test_membership_table_has_user_organization_index(self):
+        table = Organization.users.through._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        self.assertEqual(constraints['um_membership_user_org_idx']['columns'], ['user_id', 'organization_id'])
@@ -1,7 +1,66 @@
-from rest_framework_simplejwt.tokens import AccessToken
+from django.conf import settings
+from django.core.cache import caches
+from hng1.db import router
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 class CustomAccessToken(AccessToken):
     def get_token(self, user):
         token = super().get_token(user)
         token['userId'] = str(user.userId)  # Ensure userId is converted to string
-        return token
\ No newline at end of file
+        return token
+
+def add_membership_claims(token, user, org_ids=None):
+    """Add the user's organisation ids ('orgs') and membership version ('mv') to ``token``.
+
+    The version comes from ``user`` as loaded, before the memberships are
+    read, so a change in between leaves the token looking stale rather than
+    wrongly current. Callers that already know the memberships (a user who
+    has just registered) pass ``org_ids`` and no query is made. Users in
+    more than JWT_MEMBERSHIP_CLAIM_MAX_ORGS organisations get no 'orgs'
+    claim and are always checked against the database.
+    """
+    limit = settings.JWT_MEMBERSHIP_CLAIM_MAX_ORGS
+    if org_ids is None:
+        org_ids = list(user.organizations.values_list('orgId', flat=True)[:limit + 1])
+    token['mv'] = user.membership_version
+    if len(org_ids) <= limit:
+        token['orgs'] = [str(org_id) for org_id in org_ids]
+    return token
+
+def _membership_version_key(user_id):
+    return f'user_management.mv:{user_id}'
+
+def cache_membership_versions(versions):
+    """Publish ``{user_id: membership_version}`` to every worker through MEMBERSHIP_VERSION_CACHE."""
+    caches[settings.MEMBERSHIP_VERSION_CACHE].set_many(
+        {_membership_version_key(user_id): version for user_id, version in versions.items()}
+    )
+
+def current_membership_version(user_id):
+    """Return the user's current membership version.
+
+    The version is read from MEMBERSHIP_VERSION_CACHE and, on a miss, from
+    the database. It never comes from the per-process user cache, which
+    other workers' membership changes do not reach. A miss is filled with
+    ``add`` so it cannot overwrite a newer version published by
+    ``cache_membership_versions`` in the meantime, and from the primary so a
+    lagging replica cannot publish an old one.
+    """
+    from .models import User
+
+    cache = caches[settings.MEMBERSHIP_VERSION_CACHE]
+    key = _membership_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        with router.primary_reads():
+            version = User.objects.filter(pk=user_id).values_list('membership_version', flat=True).first()
+        if version is not None:
+            cache.add(key, version)
+    return version
+
+def access_token_for_user(user, org_ids=None):
+    """Issue an access token, with membership claims when JWT_MEMBERSHIP_CLAIMS is on."""
+    token = RefreshToken.for_user(user).access_token
+    if settings.JWT_MEMBERSHIP_CLAIMS:
+        add_membership_claims(token, user, org_ids)
+    return token
@@ -2,15 +2,40 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import access_token_for_user
+from .permissions import IsAdmin, IsOrganizationMember, IsSelfOrAdmin
+from . import exports
+from .pagination import OrganizationCursorPagination
 from .models import User, Organization
 from .serializers import UserSerializer, OrganizationSerializer
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from .serializers import LoginSerializer
 from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import transaction
+from hng1.db import router
+import uuid
 
-class RegisterView(generics.CreateAPIView):
+class PrimaryDatabaseMixin:
+    """Read from the primary database for the whole of a ``primary_methods`` request.
+
+    Pinned before authentication and permission checks, so every read a
+    write depends on sees rows written moments ago (see hng1.db.router).
+    """
+
+    primary_methods = ('POST',)
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in self.primary_methods:
+            router.use_primary()
+        super().initial(request, *args, **kwargs)
+
+
+class RegisterView(PrimaryDatabaseMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
@@ -27,21 +52,16 @@ class RegisterView(generics.CreateAPIView):
             }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
         try:
-            self.perform_create(serializer)
-            user_data = serializer.data
-            user = User.objects.get(email=user_data['email'])
-            
-            # Create default organization
-            org_name = f"{user_data['firstName']}'s Organisation"
-            organization = Organization.objects.create(name=org_name)
-            organization.users.add(user)  # Add user to organization
+            user, organization = self.perform_create(serializer)
+            router.identify(str(user.userId))
+            router.identify(router.email_client(user.email))
 
-            refresh = RefreshToken.for_user(user)
+            access_token = access_token_for_user(user, org_ids=[organization.orgId])
             return Response({
                 'status': 'success',
                 'message': 'Registration successful',
                 'data': {
-                    'accessToken': str(refresh.access_token),
+                    'accessToken': str(access_token),
                     'user': {
                         'userId': user.userId,
                         'firstName': user.firstName,
@@ -59,12 +79,28 @@ class RegisterView(generics.CreateAPIView):
                 'statusCode': status.HTTP_400_BAD_REQUEST
             })
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        """Create the user, their default organisation and the membership together.
+
+        The membership row is inserted directly rather than through
+        ``organization.users.add`` to skip its existence check and the
+        membership-version bump; a brand-new user has no tokens to invalidate.
+        """
+        user = serializer.save()
+        organization = Organization.objects.create(name=f"{user.firstName}'s Organisation")
+        Organization.users.through.objects.create(organization=organization, user=user)
+        return user, organization
+
 
 class LoginView(generics.GenericAPIView):
     permission_classes = [AllowAny]
     serializer_class = LoginSerializer
 
     def post(self, request, *args, **kwargs):
+        # A user who registered moments ago may not be on the replicas yet
+        if isinstance(request.data, dict) and request.data.get('email'):
+            router.identify(router.email_client(request.data['email']))
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             errors = []
@@ -79,13 +115,13 @@ class LoginView(generics.GenericAPIView):
             # Proceed with authentication logic
             user = serializer.validated_data['user']
             # Generate tokens
-            refresh = RefreshToken.for_user(user)
+            access_token = access_token_for_user(user)
             
             return Response({
                 'status': 'success',
                 'message': 'Login successful',
                 'data': {
-                    'accessToken': str(refresh.access_token),
+                    'accessToken': str(access_token),
                     'user': {
                         'userId': user.userId,
                         'firstName': user.firstName,
@@ -103,10 +139,15 @@ class LoginView(generics.GenericAPIView):
                 'statusCode': status.HTTP_401_UNAUTHORIZED
             })
         
-class OrganizationListView(generics.ListCreateAPIView):
+class OrganizationListView(PrimaryDatabaseMixin, generics.ListCreateAPIView):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrganizationCursorPagination
+
+    def get_queryset(self):
+        # Only the organisations the user belongs to, via the membership table
+        return Organization.objects.filter(users=self.request.user)
 
     def perform_create(self, serializer):
         org = serializer.save()
@@ -152,13 +193,31 @@ class OrganizationListView(generics.ListCreateAPIView):
                 'statusCode': status.HTTP_400_BAD_REQUEST
             }, status=status.HTTP_400_BAD_REQUEST)
     
-class OrganizationDetailView(generics.RetrieveAPIView):
+class ConditionalRetrieveMixin:
+    """Serve ETag/Last-Modified from the object's version and answer revalidations with 304.
+
+    The conditional headers are checked against the fetched row before the
+    serializer runs, so an unchanged object costs one query and no body.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = int(instance.updated_at.timestamp())
+        response = get_conditional_response(request, etag=instance.etag, last_modified=last_modified)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        response['ETag'] = instance.etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class OrganizationDetailView(ConditionalRetrieveMixin, generics.RetrieveAPIView):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsOrganizationMember]
 
     
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(ConditionalRetrieveMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
@@ -170,11 +229,27 @@ class UserDetailView(generics.RetrieveAPIView):
         self.check_object_permissions(self.request, obj)
         return obj
 
-class AddUserToOrganizationView(generics.GenericAPIView):
-    permission_classes = [IsAuthenticated]
+class UserOrganizationsView(generics.ListAPIView):
+    """The organisations a user belongs to, keyset-paginated like the organisation list.
+
+    Each page is one query: a range scan of the (user, organization)
+    membership index joined to the organisation rows.
+    """
+    serializer_class = OrganizationSerializer
+    permission_classes = [IsAuthenticated, IsSelfOrAdmin]
+    pagination_class = OrganizationCursorPagination
+
+    def get_queryset(self):
+        return Organization.objects.filter(users=self.kwargs['pk']).only(*OrganizationSerializer.Meta.fields)
+
+
+class AddUserToOrganizationView(PrimaryDatabaseMixin, generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsOrganizationMember]
 
     def post(self, request, *args, **kwargs):
         org_id = self.kwargs['pk']
+        if 'userIds' in request.data or isinstance(request.data.get('userId'), list):
+            return self.add_many(org_id, request.data.get('userIds', request.data.get('userId')))
         user_id = request.data.get('userId')
 
         try:
@@ -208,3 +283,77 @@ class AddUserToOrganizationView(generics.GenericAPIView):
                 'status': 'Bad request',
                 'message': str(e),  # Display the validation error message
             }, status=status.HTTP_400_BAD_REQUEST)
+
+    def add_many(self, org_id, user_ids):
+        """Add a list of users in one transaction, reporting the outcome for each id."""
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response({
+                'status': 'Bad request',
+                'message': 'userIds must be a non-empty list',
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > settings.MEMBERSHIP_BULK_MAX_USERS:
+            return Response({
+                'status': 'Bad request',
+                'message': f'At most {settings.MEMBERSHIP_BULK_MAX_USERS} users can be added at once',
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        parsed = {}
+        for user_id in user_ids:
+            try:
+                parsed[str(user_id)] = uuid.UUID(str(user_id))
+            except ValueError:
+                parsed[str(user_id)] = None
+
+        with transaction.atomic():
+            try:
+                organization = Organization.objects.select_for_update().get(orgId=org_id)
+            except Organization.DoesNotExist:
+                return Response({
+                    'status': 'Bad request',
+                    'message': 'Organization not found',
+                }, status=status.HTTP_404_NOT_FOUND)
+            except ValidationError as e:
+                return Response({
+                    'status': 'Bad request',
+                    'message': str(e),
+                }, status=status.HTTP_400_BAD_REQUEST)
+            added, already_members, _ = organization.add_members(
+                {user_id for user_id in parsed.values() if user_id is not None},
+                batch_size=settings.MEMBERSHIP_BATCH_SIZE,
+            )
+
+        results = []
+        for user_id, parsed_id in parsed.items():
+            if parsed_id in added:
+                result = 'added'
+            elif parsed_id in already_members:
+                result = 'already_member'
+            else:
+                result = 'not_found'
+            results.append({'userId': user_id, 'result': result})
+
+        return Response({
+            'status': 'success',
+            'message': 'Users processed',
+            'data': {
+                'added': len(added),
+                'alreadyMember': len(already_members),
+                'notFound': sum(1 for r in results if r['result'] == 'not_found'),
+                'results': results,
+            }
+        })
+
+
+class ExportView(generics.GenericAPIView):
+    """Stream a whole dataset (users, organisations or memberships) as NDJSON or CSV."""
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request, dataset, file_format):
+        if dataset not in exports.DATASETS or file_format not in exports.CONTENT_TYPES:
+            raise Http404
+        response = StreamingHttpResponse(
+            exports.stream(dataset, file_format),
+            content_type=exports.CONTENT_TYPES[file_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+        return response